@@ -20,6 +20,22 @@ depth_units = 0.0001  # 0 – 6.5535 meters
 
 _max_height_blocks = rgbd_stream_height // macroblock_size
 
+# Pose metadata is written as luma-only macroblocks. Luma is not subsampled by yuv420p, so each block can carry
+# 2**bit_per_macroblock gray levels. Adjacent levels are Gray coded: a block misread by one level flips a single bit.
+_gray_code = np.arange(16, dtype=np.uint8) ^ (np.arange(16, dtype=np.uint8) >> 1)
+_gray_decode = np.argsort(_gray_code).astype(np.uint8)
+
+# Forward error correction with Hamming(15, 11): bit positions 1..15, parity bits at the powers of two.
+# Codewords are interleaved so the bits of one macroblock land in different codewords; a fully damaged block
+# (or a run of damaged blocks shorter than the number of codewords / bit_per_macroblock) is always corrected.
+_hamming_code_bits = 15
+_hamming_data_bits = 11
+_hamming_positions = np.arange(1, _hamming_code_bits + 1)
+_hamming_parity_check = ((_hamming_positions >> np.arange(4)[:, np.newaxis]) & 1).astype(np.uint8)
+_hamming_parity_columns = (1 << np.arange(4)) - 1
+_hamming_data_columns = np.flatnonzero(_hamming_positions & (_hamming_positions - 1))
+_hamming_syndrome_weights = 1 << np.arange(4)
+
 
 class ChecksumMismatchError(Exception):
     pass
@@ -46,14 +62,16 @@ class GPSPose(msgspec.Struct):
     roll: float | None = None
     yaw: float | None = None
     quality: GPSQuality = GPSQuality.INVALID
-    byte_length: ClassVar[Literal[44]] = 44
+    # stamped by the sensor array when the pose is attached to a frame
+    frame_sequence: int = 0
+    capture_epoch_seconds: float | None = None
+    byte_length: ClassVar[Literal[57]] = 57
     bit_per_macroblock: ClassVar[int] = 4
-    macroblocks_required: ClassVar[int] = byte_length * bit_per_macroblock
+    luma_levels: ClassVar[int] = 2**bit_per_macroblock
+    codewords: ClassVar[int] = math.ceil(byte_length * 8 / _hamming_data_bits)
+    macroblocks_required: ClassVar[int] = math.ceil(codewords * _hamming_code_bits / bit_per_macroblock)
     width_blocks: ClassVar[int] = math.ceil(macroblocks_required / _max_height_blocks)
-    height_blocks: ClassVar[int] = macroblocks_required // width_blocks
-
-    def __post_init__(self):
-        assert GPSPose.macroblocks_required % self.width_blocks == 0
+    height_blocks: ClassVar[int] = math.ceil(macroblocks_required / width_blocks)
 
     def defined(self):
         return not (self.latitude is None or self.pitch is None)
@@ -61,7 +79,7 @@ class GPSPose(msgspec.Struct):
     def to_bytes(self):
         assert self.defined()
         buf = struct.pack(
-            "!dddffff",
+            "!dddffffIdB",
             self.epoch_seconds,
             self.latitude,
             self.longitude,
@@ -69,6 +87,9 @@ class GPSPose(msgspec.Struct):
             self.pitch,
             self.roll,
             self.yaw,
+            self.frame_sequence,
+            math.nan if self.capture_epoch_seconds is None else self.capture_epoch_seconds,
+            self.quality,
         )
         buf += struct.pack("!I", zlib.crc32(buf))
         assert len(buf) == self.byte_length
@@ -81,67 +102,83 @@ class GPSPose(msgspec.Struct):
         (crc32,) = struct.unpack("!I", crc32)
         if zlib.crc32(data) != crc32:
             raise ChecksumMismatchError((data, crc32))
-        (epoch_seconds, latitude, longitude, altitude, pitch, roll, yaw) = struct.unpack("!dddffff", data)
-        return cls(epoch_seconds, latitude, longitude, altitude, pitch, roll, yaw)
-
-    def to_macroblocks(self) -> np.ndarray:
-        arr = np.frombuffer(self.to_bytes(), dtype=np.uint8)
-        stacked_arr = np.stack((arr >> 6, arr >> 4 & 0b11, arr >> 2 & 0b11, arr & 0b11), axis=-1)
-
-        color_map = np.array(
-            [
-                [255, 0, 0],
-                [0, 255, 0],
-                [255, 255, 0],
-                [0, 0, 255],
-            ],
-            dtype=np.uint8,  # Red, Green, Yellow, Blue in RGB
+        (
+            epoch_seconds,
+            latitude,
+            longitude,
+            altitude,
+            pitch,
+            roll,
+            yaw,
+            frame_sequence,
+            capture_epoch_seconds,
+            quality,
+        ) = struct.unpack("!dddffffIdB", data)
+        if math.isnan(capture_epoch_seconds):
+            capture_epoch_seconds = None
+        return cls(
+            epoch_seconds,
+            latitude,
+            longitude,
+            altitude,
+            pitch,
+            roll,
+            yaw,
+            GPSQuality(quality),
+            frame_sequence=frame_sequence,
+            capture_epoch_seconds=capture_epoch_seconds,
         )
 
-        # Initialize the output array with shape (44, 4, 3)
-        pixels = color_map[stacked_arr]
-        pixels = pixels.reshape((self.height_blocks, self.width_blocks, -1))
-        # encode into 16 x 16 macroblocks
+    def to_macroblocks(self) -> np.ndarray:
+        data_bits = np.unpackbits(np.frombuffer(self.to_bytes(), dtype=np.uint8))
+        data_bits = np.pad(data_bits, (0, self.codewords * _hamming_data_bits - data_bits.size))
+
+        code = np.zeros((self.codewords, _hamming_code_bits), dtype=np.uint8)
+        code[:, _hamming_data_columns] = data_bits.reshape(self.codewords, _hamming_data_bits)
+        # each parity bit only contributes to its own syndrome bit, so setting it to the syndrome zeroes the syndrome
+        code[:, _hamming_parity_columns] = (code @ _hamming_parity_check.T) % 2
+
+        # interleave: consecutive bits (and therefore the bits of one macroblock) belong to different codewords
+        interleaved = code.T.reshape(-1)
+        block_count = self.width_blocks * self.height_blocks
+        interleaved = np.pad(interleaved, (0, block_count * self.bit_per_macroblock - interleaved.size))
+        symbols = np.packbits(interleaved.reshape(block_count, self.bit_per_macroblock), axis=-1, bitorder="little")
+
+        level_step = 255 // (self.luma_levels - 1)
+        luma = (_gray_decode[symbols[:, 0]] * level_step).reshape((self.height_blocks, self.width_blocks))
+        # gray pixels: r = g = b = y, u = v = 128, so the chroma planes carry nothing the decoder relies on
+        pixels = np.repeat(luma[..., np.newaxis], 3, axis=-1)
         macroblocks = np.repeat(np.repeat(pixels, macroblock_size, axis=0), macroblock_size, axis=1)
         return macroblocks
 
     @classmethod
     def from_macroblocks(cls, macroblocks: np.ndarray) -> Self | None:
-        # Define the color mapping (same as before)
-        color_map = np.array(
-            [
-                [255, 0, 0],
-                [0, 255, 0],
-                [255, 255, 0],
-                [0, 0, 255],
-            ],
-            dtype=np.int16,  # Red, Green, Yellow, Blue in RGB
-        )
-
-        # Create a mask where the average pixel in each macroblock is compared to each entry in color_map
-        # We sum the absolute errors over the color dimension (axis=3), creating a 44x4x4 error array
-        macroblock_avg = (
-            macroblocks.reshape(
-                macroblocks.shape[0] // macroblock_size,
-                macroblock_size,
-                macroblocks.shape[1] // macroblock_size,
-                macroblock_size,
-                3,
-            )
-            .mean(axis=(1, 3))
-            .astype(np.int16)
-        )
-        mask = np.sum(np.abs(macroblock_avg[:, :, np.newaxis, :] - color_map), axis=3)
-        # Find the index (0,1,2,3) of the colormap entry that is closest to the pixel
-        inverted_array = np.argmin(mask, axis=-1).astype(np.uint8)
-        inverted_array = inverted_array.reshape((cls.byte_length, 4))
-
-        decoded_bytes = (
-            (inverted_array[..., 0] << 6)
-            | (inverted_array[..., 1] << 4)
-            | (inverted_array[..., 2] << 2)
-            | inverted_array[..., 3]
-        ).tobytes()
+        # BT601 luma of the average pixel in each macroblock
+        macroblock_avg = macroblocks.reshape(
+            macroblocks.shape[0] // macroblock_size,
+            macroblock_size,
+            macroblocks.shape[1] // macroblock_size,
+            macroblock_size,
+            3,
+        ).mean(axis=(1, 3))
+        luma = macroblock_avg @ np.array([0.299, 0.587, 0.114])
+        level_step = 255 // (cls.luma_levels - 1)
+        levels = np.clip(np.rint(luma / level_step), 0, cls.luma_levels - 1).astype(np.uint8)
+        symbols = _gray_code[levels.reshape(-1)]
+
+        bits = np.unpackbits(symbols[:, np.newaxis], axis=-1, count=cls.bit_per_macroblock, bitorder="little")
+        code = bits.reshape(-1)[: cls.codewords * _hamming_code_bits].reshape(_hamming_code_bits, cls.codewords)
+        code = code.T.copy()
+
+        # the syndrome of a Hamming code is the (1-based) position of a single flipped bit
+        syndrome = ((code @ _hamming_parity_check.T) % 2) @ _hamming_syndrome_weights
+        damaged = np.flatnonzero(syndrome)
+        code[damaged, syndrome[damaged] - 1] ^= 1
+        if damaged.size:
+            logging.debug(f"corrected {damaged.size} of {cls.codewords} pose codewords")
+
+        data_bits = code[:, _hamming_data_columns].reshape(-1)[: cls.byte_length * 8]
+        decoded_bytes = np.packbits(data_bits).tobytes()
         try:
             return cls.from_bytes(decoded_bytes)
         except ChecksumMismatchError as e:
@@ -173,9 +210,25 @@ class GPSPose(msgspec.Struct):
 if __name__ == "__main__":
     import time
 
-    pose = GPSPose(time.time(), 0, 13478.578, 123.98, 5893.7, 0, 0)
+    pose = GPSPose(
+        time.time(),
+        0,
+        13478.578,
+        123.5,
+        5893.5,
+        0,
+        0,
+        GPSQuality.RTK_INT,
+        frame_sequence=42,
+        capture_epoch_seconds=time.time(),
+    )
     assert pose.defined()
     start = time.time()
     result = pose.to_macroblocks()
+    print(f"pose metadata: {result.shape[0]}x{result.shape[1]} pixels")
+    # mild compression noise everywhere, plus one fully destroyed macroblock
+    result = np.clip(result + np.random.randint(-7, 8, result.shape), 0, 255).astype(np.uint8)
+    result[:macroblock_size, :macroblock_size] = 255 - result[:macroblock_size, :macroblock_size]
     result = GPSPose.from_macroblocks(result)
+    print(f"round trip: {time.time() - start}")
     assert pose == result
@@ -1,6 +1,7 @@
 import asyncio
 import collections
 import datetime
+import itertools
 import logging
 import math
 import os
@@ -13,6 +14,7 @@ from enum import IntEnum
 
 import cv2
 import httpx
+import msgspec
 import pyrealsense2 as rs
 import pyudev
 import serial
@@ -286,6 +288,8 @@ class RGBDStream:
 
     device_fps = 60
     preset: Preset = Preset.HIGH_DENSITY_PRESET
+    # shared by all streams so the sequence keeps increasing when a stream is recreated after a FrameError
+    frame_sequence = itertools.count()
     depth_encoder: DepthEncoder = ZhouDepthEncoder(depth_units, min_depth_meters, max_depth_meters)
 
     def __init__(self):
@@ -367,6 +371,10 @@ class RGBDStream:
         # https://dev.intelrealsense.com/docs/depth-image-compression-by-colorization-for-intel-realsense-depth-cameras
         depth = self.filter_threshold.process(depth)
         depth = self.filter_spatial.process(depth)
+        # poses are shared between frames, stamp a copy
+        pose = msgspec.structs.replace(
+            pose, frame_sequence=next(self.frame_sequence), capture_epoch_seconds=frame_time
+        )
         return color, depth, pose
 
 
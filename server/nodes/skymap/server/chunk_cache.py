@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from typing import Iterator
+
+import numpy as np
+import open3d as o3d
+
+from metrics import ChunkCacheStats
+from registration import RegistrationTarget
+
+ChunkKey = tuple[int, int, int]
+
+
+class Chunk:
+    def __init__(self, pcd: o3d.geometry.PointCloud, weights: np.ndarray | None = None):
+        self.pcd = pcd
+        # fusion weight per point, None while every point has weight 1
+        self.weights = weights
+        self.lock = threading.Lock()
+        # set under lock when the chunk leaves the cache, merges must then look it up again
+        self.evicted = False
+        # incremented on every update, lets observers such as the preview notice changes
+        self.version = 0
+        self._registration_target: RegistrationTarget | None = None
+        # voxel size of the merges since the registration target was last brought up to date
+        self._merged_voxel_size: float | None = None
+
+    def update(self, pcd: o3d.geometry.PointCloud, weights: np.ndarray | None = None, voxel_size: float | None = None):
+        """
+        Replace the chunk's points. Given the voxel_size they were fused at, the registration target is brought up
+        to date incrementally on next use, see RegistrationTarget.updated; otherwise it is rebuilt.
+        """
+        self.pcd = pcd
+        self.weights = weights
+        self.version += 1
+        if voxel_size is None:
+            self._registration_target = None
+        self._merged_voxel_size = voxel_size
+
+    def nbytes(self) -> int:
+        """Size of the points, colors, normals and weights, and of the registration target's levels and trees."""
+        # float64 points, colors and normals
+        size = len(self.pcd.points) * (72 if self.pcd.has_normals() else 48)
+        if self.weights is not None:
+            size += self.weights.nbytes
+        target = self._registration_target
+        if target is not None:
+            shared = (np.asarray(self.pcd.points),)
+            if self.pcd.has_normals():
+                shared += (np.asarray(self.pcd.normals),)
+            size += target.nbytes(shared)
+        return size
+
+    def registration_target(self) -> RegistrationTarget:
+        """KD-trees and normals of the chunk's points, kept across updates where possible. Known normals are reused."""
+        normals = np.asarray(self.pcd.normals) if self.pcd.has_normals() else None
+        if self._registration_target is None:
+            self._registration_target = RegistrationTarget(np.asarray(self.pcd.points), normals)
+        elif self._merged_voxel_size is not None:
+            self._registration_target = self._registration_target.updated(
+                np.asarray(self.pcd.points), normals, self._merged_voxel_size
+            )
+        self._merged_voxel_size = None
+        return self._registration_target
+
+
+class ChunkCache:
+    """
+    Resident chunks ordered from least to most recently merged.
+
+    Eviction picks among the eviction_window least recently merged chunks the one farthest from the current
+    position, so chunks near the drone stay resident even if they were not merged in the last rollover.
+    An eviction_window of 1 (or no known position) is plain LRU.
+    """
+
+    def __init__(self, chunk_size: float, eviction_window: int = 1):
+        self.chunk_size = chunk_size
+        self.eviction_window = eviction_window
+        self.position: np.ndarray | None = None
+        self.stats = ChunkCacheStats()
+        self._chunks: OrderedDict[ChunkKey, Chunk] = OrderedDict()
+        # chunks are merged from a thread pool
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __contains__(self, key: ChunkKey) -> bool:
+        return key in self._chunks
+
+    def keys(self) -> Iterator[ChunkKey]:
+        with self._lock:
+            return iter(list(self._chunks.keys()))
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(chunk.nbytes() for chunk in self._chunks.values())
+
+    def get(self, key: ChunkKey) -> Chunk | None:
+        """Look up a chunk for merging, marking it most recently used."""
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self._chunks.move_to_end(key)
+            return chunk
+
+    def peek(self, key: ChunkKey) -> Chunk | None:
+        """Look up a chunk without counting it as a use."""
+        with self._lock:
+            return self._chunks.get(key)
+
+    def put(self, key: ChunkKey, chunk: Chunk, reloaded: bool = False):
+        with self._lock:
+            self._chunks[key] = chunk
+            self._chunks.move_to_end(key)
+            if reloaded:
+                self.stats.reloads += 1
+            self.stats.resident = len(self._chunks)
+
+    def eviction_candidate(self) -> tuple[ChunkKey, Chunk] | None:
+        with self._lock:
+            if not self._chunks:
+                return None
+            candidates = []
+            for key in self._chunks:
+                candidates.append(key)
+                if len(candidates) >= self.eviction_window:
+                    break
+            if self.position is None or len(candidates) == 1:
+                key = candidates[0]
+            else:
+                centers = np.array(candidates, dtype=np.float64) + self.chunk_size / 2
+                key = candidates[int(np.argmax(np.linalg.norm(centers - self.position, axis=1)))]
+            return key, self._chunks[key]
+
+    def evict(self, key: ChunkKey):
+        with self._lock:
+            del self._chunks[key]
+            self.stats.evictions += 1
+            self.stats.resident = len(self._chunks)
@@ -0,0 +1,563 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import msgspec
+import numpy as np
+import open3d as o3d
+
+from chunk_cache import ChunkKey
+from metrics import ChunkWriterStats
+
+
+class ManifestEntry(msgspec.Struct):
+    key: ChunkKey
+    # points column, relative to the store's directory
+    path: str
+    min_bound: tuple[float, float, float]
+    max_bound: tuple[float, float, float]
+    count: int
+    # all columns
+    bytes: int
+    # wall-clock time of the write
+    modified: float
+    # file set of the chunk, see ChunkStore.path_for; 0 for chunks written before file sets were versioned
+    version: int = 0
+
+    @classmethod
+    def from_arrays(
+        cls, key: ChunkKey, path: str, arrays: dict[str, np.ndarray], version: int = 0
+    ) -> "ManifestEntry":
+        points = arrays["points"]
+        return cls(
+            key=key,
+            path=path,
+            min_bound=tuple(points.min(axis=0).tolist()) if len(points) else (0.0, 0.0, 0.0),
+            max_bound=tuple(points.max(axis=0).tolist()) if len(points) else (0.0, 0.0, 0.0),
+            count=len(points),
+            bytes=sum(array.nbytes for array in arrays.values()),
+            modified=time.time(),
+            version=version,
+        )
+
+
+class ChunkManifest:
+    """
+    Index of the chunks in a store (manifest.json): key, file, bounds, point count, size and write time of each.
+    Held in memory for O(1) lookups and rewritten atomically, so other processes can plan their reads from the
+    file without opening any chunk. Changes are saved at most every SAVE_INTERVAL seconds, a burst of chunk writes
+    rewrites the file once; flush saves pending changes right away. A read-only manifest never writes the file.
+
+    Files retired when an entry moved to a new file set are deleted once a saved manifest stopped listing them
+    for a save interval, so readers planning from the file have time to open what it lists.
+    """
+
+    FILE_NAME = "manifest.json"
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, path: Path, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._entries: dict[ChunkKey, ManifestEntry] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._save_timer: threading.Timer | None = None
+        # retired since the last save, and retired before it (deleted after the next save)
+        self._retired: list[Path] = []
+        self._unlisted: list[Path] = []
+        if path.exists():
+            for entry in msgspec.json.decode(path.read_bytes(), type=list[ManifestEntry]):
+                self._entries[entry.key] = entry
+
+    def __contains__(self, key: ChunkKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: ChunkKey) -> ManifestEntry | None:
+        return self._entries.get(key)
+
+    def keys(self) -> list[ChunkKey]:
+        with self._lock:
+            return list(self._entries)
+
+    def entries(self) -> list[ManifestEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def update(self, *entries: ManifestEntry):
+        with self._lock:
+            for entry in entries:
+                self._entries[entry.key] = entry
+            self._changed()
+
+    def remove(self, key: ChunkKey):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._changed()
+
+    def retire(self, *paths: Path):
+        """Delete files no entry refers to any longer, once readers of the saved manifest are done with them."""
+        with self._lock:
+            self._retired.extend(paths)
+
+    def flush(self):
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self._dirty:
+                self._save()
+
+    def _changed(self):
+        if self.read_only:
+            return
+        self._dirty = True
+        delay = self._last_save + self.SAVE_INTERVAL - time.monotonic()
+        if delay <= 0:
+            self._save()
+        elif self._save_timer is None:
+            self._save_timer = threading.Timer(delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self):
+        # unique per process, another process writing the same store (e.g. lod.py) must not share it
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(msgspec.json.encode(list(self._entries.values())))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+        for path in self._unlisted:
+            path.unlink(missing_ok=True)
+        self._unlisted = self._retired
+        self._retired = []
+
+
+class ChunkStore:
+    """
+    Chunks on disk as uncompressed struct-of-arrays: one raw little-endian file per column per chunk
+    (chunk_x_y_z.v1.points, chunk_x_y_z.v1.colors, ...). Columns can be memory-mapped and appended to without
+    decompressing; compression is only applied when archiving to PCD.
+
+    Rewriting a chunk writes a new version of its file set and then points the manifest at it, so concurrent
+    readers (region queries, mesh export workers) see either the old or the new columns, never a mix. A file set
+    is complete once its marker (chunk_x_y_z.v1.complete) exists, written after the columns; recovery never
+    adopts a set without it.
+
+    Chunks are looked up through the store's ChunkManifest, which is rebuilt from the files for stores that were
+    written without one, and brought up to date with chunks written after it was last saved. A read_only store,
+    for readers such as region queries and mesh export workers, never writes: without a manifest file it indexes
+    the files in memory.
+    """
+
+    # column name -> (dtype, values per point)
+    COLUMNS: dict[str, tuple[np.dtype, int]] = {
+        "points": (np.dtype("<f4"), 3),
+        "colors": (np.dtype("u1"), 3),
+    }
+    # written when known; missing or short files (e.g. chunks from older scans) are left out by read_arrays
+    OPTIONAL_COLUMNS: dict[str, tuple[np.dtype, int]] = {
+        # fusion weight of each point, see voxel_fusion.fuse
+        "weights": (np.dtype("<f4"), 1),
+        # surface normal of each point, kept so reloaded chunks need not estimate them again
+        "normals": (np.dtype("<f4"), 3),
+    }
+    # written after a file set's columns, see _complete
+    COMPLETE_MARKER = "complete"
+    # chunk_x_y_z.points is version 0, from stores written before file sets were versioned
+    _file_pattern = re.compile(r"chunk_(-?\d+)_(-?\d+)_(-?\d+)(?:\.v(\d+))?\.points")
+
+    def __init__(self, directory: Path, read_only: bool = False):
+        self.directory = directory
+        self.read_only = read_only
+        if not read_only:
+            self.directory.mkdir(exist_ok=True, parents=True)
+        manifest_path = self.directory / ChunkManifest.FILE_NAME
+        rebuild = not manifest_path.exists()
+        self.manifest = ChunkManifest(manifest_path, read_only)
+        if rebuild:
+            self.rebuild_manifest()
+        elif not read_only:
+            self.rebuild_manifest(unlisted_only=True)
+
+    def flush(self):
+        """Save the manifest's pending changes, e.g. before the process exits."""
+        self.manifest.flush()
+
+    def path_for(self, key: ChunkKey, column: str = "points", version: int | None = None) -> Path:
+        """File of a chunk's column in file set version, by default the one the manifest lists."""
+        if version is None:
+            version = self._version(key)
+        name = f"chunk_{key[0]}_{key[1]}_{key[2]}"
+        return self.directory / (f"{name}.{column}" if version == 0 else f"{name}.v{version}.{column}")
+
+    def _version(self, key: ChunkKey) -> int:
+        entry = self.manifest.get(key)
+        return 0 if entry is None else entry.version
+
+    def _paths(self, key: ChunkKey, version: int) -> list[Path]:
+        columns = (*self.COLUMNS, *self.OPTIONAL_COLUMNS, self.COMPLETE_MARKER)
+        return [self.path_for(key, column, version) for column in columns]
+
+    def _complete(self, key: ChunkKey, version: int) -> bool:
+        """
+        Whether a file set was written completely: versioned sets have their marker, unversioned ones (which
+        predate it) columns of the same number of whole rows.
+        """
+        if version:
+            return self.path_for(key, self.COMPLETE_MARKER, version).exists()
+        rows = set()
+        for column, (dtype, width) in self.COLUMNS.items():
+            try:
+                rows.add(divmod(self.path_for(key, column, version).stat().st_size, dtype.itemsize * width))
+            except FileNotFoundError:
+                return False
+        return len(rows) == 1 and rows.pop()[1] == 0
+
+    def keys(self) -> list[ChunkKey]:
+        return self.manifest.keys()
+
+    def _files(self) -> dict[ChunkKey, list[int]]:
+        """Versions of the file sets in the directory, by chunk."""
+        versions = {}
+        for path in self.directory.glob("chunk_*.points"):
+            match = self._file_pattern.fullmatch(path.name)
+            if match is not None:
+                key = (int(match[1]), int(match[2]), int(match[3]))
+                versions.setdefault(key, []).append(int(match[4] or 0))
+        return versions
+
+    def count(self, key: ChunkKey, version: int | None = None) -> int:
+        """Points stored for a chunk; a partially written column only exposes its complete rows."""
+        counts = []
+        for column, (dtype, width) in self.COLUMNS.items():
+            try:
+                counts.append(self.path_for(key, column, version).stat().st_size // (dtype.itemsize * width))
+            except FileNotFoundError:
+                counts.append(0)
+        return min(counts)
+
+    def exists(self, key: ChunkKey) -> bool:
+        return key in self.manifest
+
+    def rebuild_manifest(self, unlisted_only: bool = False):
+        """
+        Index the chunk files of the directory, the newest complete file set of each chunk (see _complete), reading
+        its points for the bounds. unlisted_only keeps the manifest's entries unless a newer complete file set
+        exists, i.e. was written after the manifest was last saved. Writable stores delete the file sets that are
+        not indexed, including those a crash left half written.
+        """
+        entries = []
+        for key, versions in self._files().items():
+            entry = self.manifest.get(key)
+            listed = None if entry is None or not unlisted_only else entry.version
+            indexed = listed
+            for version in sorted(versions, reverse=True):
+                if listed is not None and version <= listed:
+                    break
+                if not self._complete(key, version):
+                    continue
+                arrays = self._map_arrays(key, version)
+                if arrays is not None:
+                    path = self.path_for(key, version=version).name
+                    entries.append(ManifestEntry.from_arrays(key, path, arrays, version))
+                    indexed = version
+                    break
+            if not self.read_only:
+                for version in versions:
+                    if version != indexed:
+                        for path in self._paths(key, version):
+                            path.unlink(missing_ok=True)
+        if entries or not unlisted_only:
+            self.manifest.update(*entries)
+
+    def read_arrays(self, key: ChunkKey) -> dict[str, np.ndarray] | None:
+        """Memory-mapped, read-only views of every column, and of the optional columns that are complete."""
+        entry = self.manifest.get(key)
+        if entry is None:
+            return None
+        try:
+            return self._map_arrays(key, entry.version)
+        except FileNotFoundError:
+            # retired by a rewrite while this reader planned from an older manifest
+            return None
+
+    def _map_arrays(self, key: ChunkKey, version: int) -> dict[str, np.ndarray] | None:
+        count = self.count(key, version)
+        if not count:
+            return None
+        arrays = {
+            column: np.memmap(self.path_for(key, column, version), dtype=dtype, mode="r", shape=(count, width))
+            for column, (dtype, width) in self.COLUMNS.items()
+        }
+        for column, (dtype, width) in self.OPTIONAL_COLUMNS.items():
+            path = self.path_for(key, column, version)
+            if path.exists() and path.stat().st_size >= count * dtype.itemsize * width:
+                arrays[column] = np.memmap(path, dtype=dtype, mode="r", shape=(count, width))
+        return arrays
+
+    def read(self, key: ChunkKey) -> o3d.geometry.PointCloud | None:
+        arrays = self.read_arrays(key)
+        if arrays is None:
+            return None
+        return self.to_point_cloud(arrays)
+
+    def write(self, key: ChunkKey, pcd: o3d.geometry.PointCloud):
+        self.write_arrays(key, self.from_point_cloud(pcd))
+
+    def write_arrays(self, key: ChunkKey, arrays: dict[str, np.ndarray]):
+        """
+        Replace a chunk: its columns are written as the next file set version, marked complete and then listed by
+        the manifest in place of the previous one. Writes of the same chunk must not overlap, see ChunkWriter.
+        """
+        self._check_writable()
+        previous = self.manifest.get(key)
+        version = 1 if previous is None else previous.version + 1
+        for column, array in arrays.items():
+            with open(self.path_for(key, column, version), "wb") as f:
+                f.write(array.tobytes())
+        # left over from an interrupted write of this version
+        self._remove_stale_columns(key, arrays, version)
+        self.path_for(key, self.COMPLETE_MARKER, version).touch()
+        self.manifest.update(ManifestEntry.from_arrays(key, self.path_for(key, version=version).name, arrays, version))
+        if previous is not None:
+            self.manifest.retire(*self._paths(key, previous.version))
+
+    def append(self, key: ChunkKey, pcd: o3d.geometry.PointCloud, weights: np.ndarray | None = None):
+        """Add rows to the chunk's current file set in place; readers only ever see complete rows, see count."""
+        self._check_writable()
+        previous = self.manifest.get(key)
+        version = 1 if previous is None else previous.version
+        count = self.count(key, version)
+        arrays = self.from_point_cloud(pcd, weights)
+        self._remove_stale_columns(key, arrays, version)
+        for column, array in arrays.items():
+            dtype, width = self.COLUMNS.get(column) or self.OPTIONAL_COLUMNS[column]
+            with open(self.path_for(key, column, version), "ab") as f:
+                # drop a partially written row left by an interrupted append
+                f.truncate(count * dtype.itemsize * width)
+                f.write(array.tobytes())
+        # a chunk's first append creates its file set
+        self.path_for(key, self.COMPLETE_MARKER, version).touch()
+        entry = ManifestEntry.from_arrays(key, self.path_for(key, version=version).name, arrays, version)
+        if previous is not None and count:
+            entry.min_bound = tuple(min(a, b) for a, b in zip(previous.min_bound, entry.min_bound))
+            entry.max_bound = tuple(max(a, b) for a, b in zip(previous.max_bound, entry.max_bound))
+            entry.count += count
+            entry.bytes += count * sum(array.itemsize * array.shape[1] for array in arrays.values())
+        self.manifest.update(entry)
+
+    def _remove_stale_columns(self, key: ChunkKey, arrays: dict[str, np.ndarray], version: int):
+        # an optional column that was not written no longer matches the points
+        for column in self.OPTIONAL_COLUMNS:
+            if column not in arrays:
+                self.path_for(key, column, version).unlink(missing_ok=True)
+
+    def remove(self, key: ChunkKey):
+        self._check_writable()
+        version = self._version(key)
+        self.manifest.remove(key)
+        self.manifest.retire(*self._paths(key, version))
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"chunk store {self.directory} is read-only")
+
+    def archive(self, directory: Path, compressed: bool = True):
+        """Export every chunk as a (compressed) PCD file, e.g. for transfer or for tools that only read PCD."""
+        directory.mkdir(exist_ok=True, parents=True)
+        for key in self.keys():
+            pcd = self.read(key)
+            if pcd is None:
+                continue
+            o3d.io.write_point_cloud(
+                (directory / f"chunk_{key[0]}_{key[1]}_{key[2]}.pcd").as_posix(),
+                pcd,
+                format="pcd",
+                write_ascii=False,
+                compressed=compressed,
+            )
+
+    @classmethod
+    def from_point_cloud(
+        cls, pcd: o3d.geometry.PointCloud, weights: np.ndarray | None = None
+    ) -> dict[str, np.ndarray]:
+        points = np.asarray(pcd.points)
+        if pcd.has_colors():
+            colors = np.rint(np.asarray(pcd.colors) * 255)
+        else:
+            colors = np.zeros_like(points)
+        arrays = {
+            "points": points.astype(cls.COLUMNS["points"][0]),
+            "colors": colors.astype(cls.COLUMNS["colors"][0]),
+        }
+        if weights is not None:
+            arrays["weights"] = weights.reshape(-1, 1).astype(cls.OPTIONAL_COLUMNS["weights"][0])
+        if pcd.has_normals():
+            arrays["normals"] = np.asarray(pcd.normals).astype(cls.OPTIONAL_COLUMNS["normals"][0])
+        return arrays
+
+    @classmethod
+    def to_point_cloud(cls, arrays: dict[str, np.ndarray]) -> o3d.geometry.PointCloud:
+        pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(arrays["points"].astype(np.float64)))
+        pcd.colors = o3d.utility.Vector3dVector(arrays["colors"] / 255)
+        if "normals" in arrays:
+            pcd.normals = o3d.utility.Vector3dVector(arrays["normals"].astype(np.float64))
+        return pcd
+
+
+class ChunkWriter:
+    """
+    Persists chunk snapshots on a bounded thread pool so file IO never runs on the event loop.
+
+    Snapshots that are submitted but not yet on disk are returned by pending(), which must be consulted before
+    reading a chunk from the store. When a chunk is snapshotted again before its previous write ran, only the
+    newest snapshot is written.
+
+    derived, if given, is called with (key, arrays) after each write on the same worker, e.g. LODPyramid.write.
+
+    A failed write is retried up to MAX_ATTEMPTS times, after which the snapshot is dropped and logged: it stays
+    pending until then, so the chunk's data is never silently lost between memory and disk.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        store: ChunkStore,
+        max_workers: int = 2,
+        max_queue_depth: int = 16,
+        derived: Callable[[ChunkKey, dict[str, np.ndarray]], None] | None = None,
+    ):
+        self.store = store
+        self.derived = derived
+        self.max_queue_depth = max_queue_depth
+        self.stats = ChunkWriterStats()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="chunk-writer")
+        self._lock = threading.Lock()
+        self._version = 0
+        self._pending: dict[ChunkKey, tuple[int, dict[str, np.ndarray]]] = {}
+        self._key_locks: dict[ChunkKey, threading.Lock] = {}
+        self._futures: set[Future] = set()
+
+    def pending(self, key: ChunkKey) -> dict[str, np.ndarray] | None:
+        with self._lock:
+            snapshot = self._pending.get(key)
+        return None if snapshot is None else snapshot[1]
+
+    def pending_keys(self) -> list[ChunkKey]:
+        with self._lock:
+            return list(self._pending)
+
+    def full(self) -> bool:
+        return self.stats.queue_depth >= self.max_queue_depth
+
+    def submit(self, key: ChunkKey, arrays: dict[str, np.ndarray]) -> Future:
+        with self._lock:
+            self._version += 1
+            version = self._version
+            self._pending[key] = (version, arrays)
+        return self._submit(key, version, arrays, 1)
+
+    def _submit(self, key: ChunkKey, version: int, arrays: dict[str, np.ndarray], attempt: int) -> Future:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            self.stats.queue_depth += 1
+        try:
+            future = self._executor.submit(self._write, key, version, arrays, key_lock)
+        except RuntimeError:
+            # shut down
+            with self._lock:
+                self.stats.queue_depth -= 1
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(functools.partial(self._written, key, version, arrays, attempt))
+        return future
+
+    def _written(self, key: ChunkKey, version: int, arrays: dict[str, np.ndarray], attempt: int, future: Future):
+        error = future.exception()
+        if error is not None:
+            with self._lock:
+                latest = self._pending.get(key)
+                current = latest is not None and latest[0] == version
+            retried = False
+            if current and attempt < self.MAX_ATTEMPTS:
+                logging.warning(f"failed to write chunk {key} (attempt {attempt}), retrying", exc_info=error)
+                try:
+                    self._submit(key, version, arrays, attempt + 1)
+                    retried = True
+                except RuntimeError:
+                    pass
+            if current and not retried:
+                logging.error(f"failed to write chunk {key}, its snapshot is dropped", exc_info=error)
+                with self._lock:
+                    if self._pending.get(key) is latest:
+                        del self._pending[key]
+                    self.stats.failed += 1
+        with self._lock:
+            self._futures.discard(future)
+
+    def _write(self, key: ChunkKey, version: int, arrays: dict[str, np.ndarray], key_lock: threading.Lock):
+        start = time.time()
+        try:
+            with key_lock:
+                with self._lock:
+                    # pending is only cleared by the write of the newest snapshot
+                    latest = self._pending.get(key)
+                    superseded = latest is None or latest[0] != version
+                if superseded:
+                    with self._lock:
+                        self.stats.skipped += 1
+                    return
+                self.store.write_arrays(key, arrays)
+                if self.derived is not None:
+                    try:
+                        self.derived(key, arrays)
+                    except Exception as e:
+                        # the chunk itself is on disk, only what is derived from it is missing
+                        logging.exception(e)
+                with self._lock:
+                    if self._pending[key][0] == version:
+                        del self._pending[key]
+                    self.stats.writes += 1
+                    self.stats.write_latency.record(time.time() - start)
+        finally:
+            with self._lock:
+                self.stats.queue_depth -= 1
+
+    async def drain(self):
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            # failed writes are logged and retried by _written
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.store.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive a chunk store as PCD files.")
+    parser.add_argument("data_dir", type=Path, help="Path to the scan's chunk store")
+    parser.add_argument("archive_dir", type=Path, help="Where to write the .pcd files")
+    parser.add_argument("--uncompressed", action="store_true", help="Write uncompressed binary PCD")
+    args = parser.parse_args()
+
+    ChunkStore(args.data_dir, read_only=True).archive(args.archive_dir, compressed=not args.uncompressed)
@@ -18,8 +18,46 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import math
+
 import numpy as np
-from scipy.spatial.transform import Rotation
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def _geo2ecef(gps: np.ndarray, a: float, e2: float, b2_a2: float) -> np.ndarray:
+    ecef = np.empty_like(gps)
+    for i in prange(gps.shape[0]):
+        phi = math.radians(gps[i, 0])
+        lmd = math.radians(gps[i, 1])
+        height = gps[i, 2]
+        cPhi = math.cos(phi)
+        sPhi = math.sin(phi)
+        N = a / math.sqrt(1.0 - e2 * sPhi * sPhi)
+        ecef[i, 0] = (N + height) * cPhi * math.cos(lmd)
+        ecef[i, 1] = (N + height) * cPhi * math.sin(lmd)
+        ecef[i, 2] = (b2_a2 * N + height) * sPhi
+    return ecef
+
+
+@njit(parallel=True, cache=True)
+def _ecef2geo(ecef: np.ndarray, a: float, b: float, e: float, e2: float) -> np.ndarray:
+    gps = np.empty_like(ecef)
+    for i in prange(ecef.shape[0]):
+        x = ecef[i, 0]
+        y = ecef[i, 1]
+        z = ecef[i, 2]
+        p = math.sqrt(x * x + y * y)
+        q = math.atan2(a * z, b * p)
+        sq = math.sin(q)
+        cq = math.cos(q)
+        phi = math.atan2(z + e * b * sq * sq * sq, p - e2 * a * cq * cq * cq)
+        sPhi = math.sin(phi)
+        v = a / math.sqrt(1.0 - e2 * sPhi * sPhi)
+        gps[i, 0] = math.degrees(phi)
+        gps[i, 1] = math.degrees(math.atan2(y, x))
+        gps[i, 2] = (p / math.cos(phi)) - v
+    return gps
 
 
 class ENUCoordinateSystem:
@@ -30,6 +68,7 @@ class ENUCoordinateSystem:
     Use setENUorigin(lat, lon, height) to set the local ENU coordinate system origin
     Use gps2enu(lat, lon, height) to get the position in the local ENU system
     Use enu2gps(x_enu, y_enu, z_enu) to get the latitude, longitude and height
+    Use gps2enu_batch / enu2gps_batch to convert (N, 3) arrays of points at once
     """
 
     def __init__(self):
@@ -48,7 +87,7 @@ class ENUCoordinateSystem:
         self.xZero = None
         self.yZero = None
         self.zZero = None
-        self.R = np.asmatrix(np.eye(3))
+        self.R = np.eye(3)
 
     def has_origin(self):
         return self.latZero is not None
@@ -105,7 +144,7 @@ class ENUCoordinateSystem:
     def ecef2enu(self, x, y, z):
         ecef = np.array([[x], [y], [z]])
 
-        return self.R * (ecef - self.oZero)
+        return self.R @ (ecef - self.oZero)
 
     def gps2enu(self, lat, lon, height):
         ecef = self.geo2ecef(lat, lon, height)
@@ -158,52 +197,153 @@ class ENUCoordinateSystem:
 
         return self.ecef2gps(ecef.item(0), ecef.item(1), ecef.item(2))
 
+    def gps2enu_batch(self, gps: np.ndarray) -> np.ndarray:
+        """(N, 3) latitude, longitude, height -> (N, 3) east, north, up"""
+        gps = np.ascontiguousarray(gps, dtype=np.float64).reshape(-1, 3)
+        ecef = _geo2ecef(gps, self.a, self.e2, self.b2 / self.a2)
+        return (ecef - self.oZero[:, 0]) @ self.R.T
 
-def create_transformation_matrix(x: float, y: float, z: float, yaw: float, pitch: float, roll: float, degrees=True):
+    def enu2gps_batch(self, enu: np.ndarray) -> np.ndarray:
+        """(N, 3) east, north, up -> (N, 3) latitude, longitude, height"""
+        enu = np.asarray(enu, dtype=np.float64).reshape(-1, 3)
+        ecef = np.ascontiguousarray(enu @ self.R + self.oZero[:, 0])
+        return _ecef2geo(ecef, self.a, self.b, self.e, self.e2)
+
+
+def create_transformation_matrices(
+    translations: np.ndarray, angles: np.ndarray, degrees=True
+) -> tuple[np.ndarray, np.ndarray]:
     """
-    Creates a 4x4 transformation matrix (extrinsic matrix) from translation and Euler angles.
+    Creates 4x4 rigid transformation matrices (extrinsic matrices) and their inverses from translations and Euler angles.
+
+    The rotation is applied in the 'zyx' order about fixed axes: first yaw (around Z), then pitch (around Y),
+    then roll (around X), i.e. R = Rx(roll) @ Ry(pitch) @ Rz(yaw), the same as
+    scipy's Rotation.from_euler("zyx", [yaw, pitch, roll]).
 
     Parameters:
-        :param x
-        :param y
-        :param z
-            Translation components.
-        :param pitch
-        :param roll
-        :param yaw
-            Euler angles representing rotations around the axes.
+        :param translations
+            (N, 3) x, y, z translation components.
+        :param angles
+            (N, 3) yaw, pitch, roll Euler angles.
         :param degrees
             If True, the provided angles are in degrees.
 
     Returns:
-        extrinsic : numpy.ndarray
-            4x4 transformation (extrinsic) matrix.
+        extrinsics : numpy.ndarray
+            (N, 4, 4) transformation (extrinsic) matrices.
+        inverses : numpy.ndarray
+            (N, 4, 4) inverse transformations: [R^T, -R^T t], no general matrix inversion needed.
     """
+    translations = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1, 3)
+    if degrees:
+        angles = np.deg2rad(angles)
+    cy, cp, cr = np.cos(angles).T
+    sy, sp, sr = np.sin(angles).T
+
+    n = translations.shape[0]
+    extrinsics = np.zeros((n, 4, 4))
+    R = extrinsics[:, :3, :3]
+    R[:, 0, 0] = cp * cy
+    R[:, 0, 1] = -cp * sy
+    R[:, 0, 2] = sp
+    R[:, 1, 0] = cr * sy + sr * sp * cy
+    R[:, 1, 1] = cr * cy - sr * sp * sy
+    R[:, 1, 2] = -sr * cp
+    R[:, 2, 0] = sr * sy - cr * sp * cy
+    R[:, 2, 1] = sr * cy + cr * sp * sy
+    R[:, 2, 2] = cr * cp
+    extrinsics[:, :3, 3] = translations
+    extrinsics[:, 3, 3] = 1.0
+
+    inverses = np.zeros((n, 4, 4))
+    R_inv = np.swapaxes(R, 1, 2)
+    inverses[:, :3, :3] = R_inv
+    inverses[:, :3, 3] = -np.einsum("nij,nj->ni", R_inv, translations)
+    inverses[:, 3, 3] = 1.0
+    return extrinsics, inverses
+
+
+def create_rigid_transform(
+    x: float, y: float, z: float, yaw: float, pitch: float, roll: float, degrees=True
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Single pose version of create_transformation_matrices, returns the 4x4 extrinsic and its inverse.
+    """
+    extrinsics, inverses = create_transformation_matrices(
+        np.array([x, y, z]), np.array([yaw, pitch, roll]), degrees=degrees
+    )
+    return extrinsics[0], inverses[0]
 
-    # Define the Euler angle order.
-    # The choice of order ('xyz', 'zyx', etc.) depends on your application's convention.
-    # In this example, we assume that the rotation is applied in the 'zyx' order:
-    # first yaw (around Z), then pitch (around Y), then roll (around X).
-    rotation = Rotation.from_euler("zyx", [yaw, pitch, roll], degrees=degrees)
-
-    # Get the rotation matrix (3x3)
-    R_mat = rotation.as_matrix()
-
-    # Create the 4x4 transformation matrix initialized to identity
-    extrinsic = np.eye(4)
-
-    # Insert the rotation into the 3x3 upper-left submatrix
-    extrinsic[:3, :3] = R_mat
-
-    # Insert the translation vector into the matrix (last column)
-    extrinsic[:3, 3] = np.array([x, y, z])
 
-    return extrinsic
+def create_transformation_matrix(x: float, y: float, z: float, yaw: float, pitch: float, roll: float, degrees=True):
+    """
+    Creates a 4x4 transformation matrix (extrinsic matrix) from translation and Euler angles.
+    See create_transformation_matrices for the rotation convention.
+    """
+    return create_rigid_transform(x, y, z, yaw, pitch, roll, degrees=degrees)[0]
 
 
 if __name__ == "__main__":
+    import time
+
     coord = ENUCoordinateSystem()
     coord.set_enu_origin(45.0, 135.0, 0.0)
     print(coord.gps2enu(45.0, 135.0, 0.0))
     print(coord.gps2enu(45, 135, 1.0))
+
+    n = 100_000
+    gps = np.column_stack(
+        (
+            45.0 + np.random.uniform(-0.01, 0.01, n),
+            135.0 + np.random.uniform(-0.01, 0.01, n),
+            np.random.uniform(0, 100, n),
+        )
+    )
+    coord.gps2enu_batch(gps[:1])  # compile
+    coord.enu2gps_batch(gps[:1])
+
+    start = time.time()
+    single = np.array([coord.gps2enu(*p)[:, 0] for p in gps[:1000]])
+    print(f"gps2enu: {(time.time() - start) / 1000 * 1e6:.3f} us/point")
+    start = time.time()
+    enu = coord.gps2enu_batch(gps)
+    print(f"gps2enu_batch: {(time.time() - start) / n * 1e6:.3f} us/point")
+    assert np.allclose(single, enu[:1000])
+
+    start = time.time()
+    single = np.array([coord.enu2gps(*p)[:, 0] for p in enu[:1000]])
+    print(f"enu2gps: {(time.time() - start) / 1000 * 1e6:.3f} us/point")
+    start = time.time()
+    round_trip = coord.enu2gps_batch(enu)
+    print(f"enu2gps_batch: {(time.time() - start) / n * 1e6:.3f} us/point")
+    assert np.allclose(single, round_trip[:1000])
+    assert np.allclose(gps, round_trip, rtol=0, atol=1e-6)
+
     print(create_transformation_matrix(1, 2, 3, 90, 256, -90))
+
+    from scipy.spatial.transform import Rotation
+
+    translations = np.random.uniform(-100, 100, (n, 3))
+    angles = np.random.uniform(-360, 360, (n, 3))
+    start = time.time()
+    for t, a in zip(translations[:1000], angles[:1000]):
+        expected = np.eye(4)
+        expected[:3, :3] = Rotation.from_euler("zyx", a, degrees=True).as_matrix()
+        expected[:3, 3] = t
+        np.linalg.inv(expected)
+    print(f"scipy Rotation + np.linalg.inv: {(time.time() - start) / 1000 * 1e6:.3f} us/pose")
+    start = time.time()
+    extrinsics, inverses = create_transformation_matrices(translations, angles)
+    print(f"create_transformation_matrices: {(time.time() - start) / n * 1e6:.3f} us/pose")
+
+    expected = np.tile(np.eye(4), (n, 1, 1))
+    expected[:, :3, :3] = Rotation.from_euler("zyx", angles, degrees=True).as_matrix()
+    expected[:, :3, 3] = translations
+    assert np.allclose(extrinsics, expected)
+    assert np.allclose(inverses, np.linalg.inv(expected))
+    assert np.allclose(create_transformation_matrix(*translations[0], *angles[0]), expected[0])
+    x, y, z = translations[0]
+    yaw, pitch, roll = np.deg2rad(angles[0])
+    extrinsic, inverse = create_rigid_transform(x, y, z, yaw, pitch, roll, degrees=False)
+    assert np.allclose(extrinsic, expected[0]) and np.allclose(inverse @ extrinsic, np.eye(4))
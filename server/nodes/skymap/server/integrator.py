@@ -1,50 +1,255 @@
 import asyncio
 import logging
-import os
+import multiprocessing
+import queue
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
 from pathlib import Path
+from typing import Sequence
 
 import numpy as np
 import open3d as o3d
 from numpy.linalg import LinAlgError
+from scipy.spatial import cKDTree
+
+from chunk_cache import Chunk, ChunkCache, ChunkKey
+from chunk_store import ChunkStore, ChunkWriter
+from lod import LODPyramid
+from merge_scheduler import MergeScheduler, merge_buffer_size, merge_buffer_views
+from mesh_export import export_meshes
+from metrics import IntegrationStats, MemoryStats, MergeStats
+from outliers import incoming_inliers
+from region import chunk_intersects, concatenate, crop_arrays, query_store
+from registration import RegistrationResult, RegistrationTarget, estimate_normals, register
+from swarmnode_skymap_common import GPSQuality
+from tsdf import TSDFVolume, create_tsdf_volume
+from voxel_fusion import fuse
+
+
+class SensorIntegrator:
+    """
+    One sensor's TSDF volume with its frame queue and integration worker thread. Each sensor of a
+    ReconstructionVolume fuses into its own volume, so sensors integrate in parallel on their own cores, and
+    rolls over into the shared chunks, where the MergeScheduler serializes merges per chunk.
+    """
+
+    def __init__(self, reconstruction: "ReconstructionVolume", name: str, backend: str):
+        self.reconstruction = reconstruction
+        self.name = name
+        self.volume: TSDFVolume = create_tsdf_volume(backend, reconstruction.VOXEL_SIZE, reconstruction.VOXEL_SIZE * 5)
+        # held by whoever touches the TSDF: the integration worker, rollover and visualization
+        self.volume_lock = threading.Lock()
+        self.stats = IntegrationStats()
+        self.queue: queue.Queue[tuple[float, o3d.geometry.RGBDImage, np.ndarray, np.ndarray, bool] | None] = (
+            queue.Queue(maxsize=reconstruction.INTEGRATION_QUEUE_SIZE)
+        )
+        self.num_images = 0
+        # images integrated since the last rollover without a trusted pose
+        self.untrusted_images = 0
+        # TSDFVolume.used_bytes after the last integration
+        self.used_bytes: int | None = None
+        self.worker = threading.Thread(target=self._worker, name=f"tsdf-integration-{name}", daemon=True)
+        self.worker.start()
+
+    def _worker(self):
+        reconstruction = self.reconstruction
+        while (item := self.queue.get()) is not None:
+            queued_time, rgbd_image, extrinsic, extrinsic_inv, trusted = item
+            start = time.time()
+            self.stats.queue_latency.record(start - queued_time)
+            try:
+                with self.volume_lock:
+                    self.volume.integrate(rgbd_image, reconstruction.INTRINSICS, extrinsic_inv)
+                    self.used_bytes = self.volume.used_bytes()
+            except Exception as e:
+                logging.exception(e)
+                continue
+            finally:
+                self.stats.queue_depth = self.queue.qsize()
+            self.stats.latency.record(time.time() - start)
+            self.stats.integrated += 1
+            reconstruction.chunks.position = extrinsic[:3, 3]
+            self.num_images += 1
+            if not trusted:
+                self.untrusted_images += 1
+            if reconstruction.rollover_due(self):
+                # integration pauses until the flushed surface is queued for merging
+                try:
+                    asyncio.run_coroutine_threadsafe(reconstruction.rollover(self), reconstruction.loop).result()
+                except Exception as e:
+                    # the worker must outlive a failed rollover, add_image and close wait on its queue
+                    logging.exception(e)
+        logging.debug(f"finish integration worker of {self.name}")
 
+    def extract_point_cloud(self) -> o3d.geometry.PointCloud:
+        with self.volume_lock:
+            return self.volume.extract_point_cloud()
 
-class Chunk:
-    def __init__(self, pcd: o3d.geometry.PointCloud):
-        self.pcd = pcd
-        self.lock = threading.Lock()
+    def flush(self) -> o3d.geometry.PointCloud:
+        with self.volume_lock:
+            return self.volume.flush()
+
+    async def close(self):
+        """
+        Integrate what is still queued and stop the worker. The worker keeps rolling over while it drains the
+        queue, so process_pcd_task must still be consuming rollovers until this returns.
+        """
+        await asyncio.to_thread(self.queue.put, None)
+        await asyncio.to_thread(self.worker.join)
 
 
 class ReconstructionVolume:
+    # sensor of add_image when none is named
+    DEFAULT_SENSOR = "default"
+    # rollover cadence for TSDF backends that do not report their memory use
     IMAGE_THRESHOLD = 500
+    # bytes the TSDF volumes and the resident chunks may use together. The TSDF volumes roll over once they use
+    # TSDF_BUDGET_FRACTION of it, but not before MIN_ROLLOVER_IMAGES images; chunks are evicted beyond the rest.
+    MEMORY_BUDGET = 4 * 2**30
+    TSDF_BUDGET_FRACTION = 0.5
+    MIN_ROLLOVER_IMAGES = 30
     IN_MEMORY_CHUNKS = 300
+    # rollovers whose chunk merges may be in flight at once, further rollovers wait
+    MAX_PENDING_ROLLOVERS = 2
+    # evict the farthest of the N least recently merged chunks, 1 is plain LRU
+    EVICTION_WINDOW = 16
     CHUNK_SIZE = 5
+    # most recently written chunks loaded back into memory when a scan is resumed
+    RESUME_PREFETCH_CHUNKS = 64
+    # frames buffered for each sensor's integration worker
+    INTEGRATION_QUEUE_SIZE = 8
+    # what add_image does when the integration queue is full:
+    # drop_oldest keeps the freshest frames, drop_newest keeps the backlog, block waits for the worker
+    DROP_POLICIES = ("drop_oldest", "drop_newest", "block")
     VOXEL_SIZE = 0.02
-    INTRINSICS = o3d.camera.PinholeCameraIntrinsic(
+    # ICP runs at these multiples of VOXEL_SIZE, coarse to fine, within a time budget per merge; preparing the
+    # chunk's trees and normals (once, they are cached with it) is not counted, see registration.register
+    REGISTRATION_SCALES = (16, 4, 1)
+    REGISTRATION_ITERATIONS = 30
+    REGISTRATION_BUDGET = 0.5
+    # registrations that ran out of time before the finest scale, matched less than REGISTRATION_MIN_FITNESS of
+    # the source or left an rmse above REGISTRATION_MAX_RMSE are rejected
+    REGISTRATION_MIN_FITNESS = 0.1
+    REGISTRATION_MAX_RMSE = VOXEL_SIZE
+    # poses trusted enough to merge without registration when the overlap agrees
+    TRUSTED_QUALITIES = frozenset({GPSQuality.RTK_INT})
+    # source points within OVERLAP_DISTANCE of the chunk overlap it; if at least MIN_OVERLAP of them do,
+    # their median distance must be within ALIGNED_RESIDUAL to skip registration. OVERLAP_DISTANCE matches
+    # the coarsest registration search radius, so offsets registration could fix are not mistaken for new area
+    OVERLAP_DISTANCE = 2 * REGISTRATION_SCALES[0] * VOXEL_SIZE
+    MIN_OVERLAP = 0.1
+    ALIGNED_RESIDUAL = VOXEL_SIZE
+    ALIGNMENT_SAMPLES = 5000
+    # incoming points whose mean distance to their OUTLIER_NEIGHBOURS nearest neighbours is more than
+    # OUTLIER_STD_RATIO standard deviations above the mean are not merged
+    OUTLIER_NEIGHBOURS = 16
+    OUTLIER_STD_RATIO = 3.0
+    # cap on the per-voxel fusion weight, so long observed surfaces still follow new data
+    MAX_POINT_WEIGHT = 64
+    # the preview shows chunks closer than PREVIEW_LOD_DISTANCES[i] meters to the drone at LOD level i,
+    # chunks beyond the last distance at the coarsest level
+    PREVIEW_LOD_DISTANCES = (15, 40, 100)
+    # the preview checks for chunks crossing those distances once the drone moved PREVIEW_LEVEL_STEP meters
+    PREVIEW_LEVEL_STEP = 1.0
+    INTRINSICS: o3d.camera.PinholeCameraIntrinsic = o3d.camera.PinholeCameraIntrinsic(
         640, 480, 384.697448730469, 384.697448730469, 319.480712890625, 240.813415527344
     )
 
-    def __init__(self, output_base_path: Path):
-        self.volume = o3d.pipelines.integration.ScalableTSDFVolume(
-            voxel_length=self.VOXEL_SIZE,
-            sdf_trunc=self.VOXEL_SIZE * 5,
-            color_type=o3d.pipelines.integration.TSDFVolumeColorType.RGB8,
-        )
-        self.num_images = 0
-        self.chunks: dict[tuple[int, int, int], Chunk] = {}
-        self.pcd_queue: asyncio.Queue[o3d.geometry.PointCloud] = asyncio.Queue(maxsize=2)
+    def __init__(
+        self,
+        output_base_path: Path,
+        backend: str = "legacy",
+        drop_policy: str = "drop_oldest",
+        merge_processes: int = 0,
+        memory_budget: int | None = None,
+        sensors: Sequence[str] = (DEFAULT_SENSOR,),
+    ):
+        """
+        backend is a key of tsdf.BACKENDS, drop_policy one of DROP_POLICIES.
+        sensors names the sensors whose images are integrated, each into its own TSDF volume, see SensorIntegrator.
+        merge_processes > 0 runs the merges themselves in that many worker processes, exchanging points through
+        shared memory, instead of on the merge threads.
+        memory_budget overrides MEMORY_BUDGET.
+        """
+        if drop_policy not in self.DROP_POLICIES:
+            raise ValueError(f"unknown drop policy {drop_policy!r}, expected one of {', '.join(self.DROP_POLICIES)}")
+        self.drop_policy = drop_policy
+        self.memory_stats = MemoryStats(budget=memory_budget or self.MEMORY_BUDGET)
+        self.loop = asyncio.get_running_loop()
+        self.merge_stats = MergeStats()
+        self.chunks = ChunkCache(self.CHUNK_SIZE, self.EVICTION_WINDOW)
+        self.merges = MergeScheduler()
+        self.merge_processes: ProcessPoolExecutor | None = None
+        if merge_processes:
+            # spawn, forking a process that runs threads and Open3D is not safe
+            self.merge_processes = ProcessPoolExecutor(merge_processes, mp_context=multiprocessing.get_context("spawn"))
+        self.pending_rollovers: deque[list[Future]] = deque()
+        # flushed surface, and whether all of it was integrated from trusted poses; None once close() put the last
+        self.pcd_queue: asyncio.Queue[tuple[o3d.geometry.PointCloud, bool] | None] = asyncio.Queue(maxsize=2)
         self.active = True
         self.process_pcd_task_alive = asyncio.Event()
         self.write_to_disk_task_alive = asyncio.Event()
         self.vis_task_alive = asyncio.Event()
         self.output = output_base_path
-        self.output.mkdir(exist_ok=True, parents=True)
+        self.store = ChunkStore(self.output)
+        self.lod = LODPyramid(self.store)
+        self.writer = ChunkWriter(self.store, derived=self._write_lod)
+        # chunks merged or written since the preview last looked, it only refreshes those
+        self._preview_changes: set[ChunkKey] = set(self.store.keys())
+        self._preview_changes_lock = threading.Lock()
         assert output_base_path.is_dir()
         self.vis = o3d.visualization.Visualizer()
         asyncio.create_task(self.process_pcd_task())
         asyncio.create_task(self.write_to_disk_task())
+        self.sensors = {name: SensorIntegrator(self, name, backend) for name in sensors}
+
+    def resume(self, position: np.ndarray | None = None) -> list[Future]:
+        """
+        Continue a scan whose chunks are already in the store. The store's manifest indexes them without reading
+        any points; the RESUME_PREFETCH_CHUNKS most recently written are loaded in parallel in the background, so
+        the first rollovers merge in memory. position, the scan's last camera position, seeds eviction until a
+        frame is integrated.
+        """
+        if position is not None:
+            self.chunks.position = np.asarray(position, dtype=np.float64)
+        entries = sorted(self.store.manifest.entries(), key=lambda entry: entry.modified, reverse=True)
+        futures = []
+        for entry in entries[: self.RESUME_PREFETCH_CHUNKS]:
+            # queued like a merge, so a merge into the chunk waits for the load instead of reading it again
+            future = self.merges.submit(entry.key, self._load_chunk, entry.key)
+            future.add_done_callback(self._log_merge_failure)
+            futures.append(future)
+        logging.info(f"resuming with {len(entries)} stored chunks, prefetching {len(futures)}")
+        return futures
+
+    def _load_chunk(self, key: ChunkKey):
+        if self.chunks.peek(key) is not None:
+            return
+        arrays = self.store.read_arrays(key)
+        if arrays is not None:
+            self.chunks.put(key, Chunk(self.store.to_point_cloud(arrays), arrays.get("weights")), reloaded=True)
+            self._preview_changed(key)
+
+    def _write_lod(self, key: ChunkKey, arrays: dict[str, np.ndarray]):
+        """
+        ChunkWriter hook: the stored pyramid levels are only read for chunks that are not resident, resident ones
+        are downsampled from memory, so they are rebuilt when the chunk is written rather than on every merge.
+        """
+        self.lod.write(key, arrays)
+        self._preview_changed(key)
+
+    def _preview_changed(self, key: ChunkKey):
+        with self._preview_changes_lock:
+            self._preview_changes.add(key)
+
+    def _take_preview_changes(self) -> set[ChunkKey]:
+        with self._preview_changes_lock:
+            changes = self._preview_changes
+            self._preview_changes = set()
+        return changes
 
     def start_visualization(self):
         if self.vis_task_alive.is_set():
@@ -63,63 +268,271 @@ class ReconstructionVolume:
 
         asyncio.create_task(rerender())
         pcd: o3d.geometry.PointCloud | None = None
+        # chunk -> (geometry, LOD level, version) currently in the visualizer
+        shown: dict[ChunkKey, tuple[o3d.geometry.PointCloud, int, object]] = {}
+        # drone position the shown LOD levels were last checked at
+        level_position: np.ndarray | None = None
         once = True
         while self.active:
             last_pcd = pcd
-            pcd = await asyncio.to_thread(self.volume.extract_point_cloud)
-            if pcd.has_points():
+            pcd = await asyncio.to_thread(self._extract_point_cloud)
+            keys = self._take_preview_changes()
+            position = self.chunks.position
+            if position is not None and (
+                level_position is None or np.linalg.norm(position - level_position) >= self.PREVIEW_LEVEL_STEP
+            ):
+                level_position = position.copy()
+                shown_keys = list(shown)
+                levels = self._preview_levels(shown_keys)
+                keys.update(key for key, level in zip(shown_keys, levels) if shown[key][1] != level)
+            previews = await asyncio.to_thread(
+                self._chunk_previews, keys, {key: (level, version) for key, (_, level, version) in shown.items()}
+            )
+            if pcd.has_points() or previews:
                 if once:
                     reset = True
                     once = False
                 else:
                     reset = False
-                self.vis.remove_geometry(last_pcd, reset_bounding_box=reset)
-                self.vis.add_geometry(pcd, reset_bounding_box=reset)
-                logging.debug(f"rendering pcd with {np.asarray(pcd.points).shape[0]} points")
+                for key, preview in previews.items():
+                    if key in shown:
+                        self.vis.remove_geometry(shown[key][0], reset_bounding_box=False)
+                    self.vis.add_geometry(preview[0], reset_bounding_box=reset)
+                    shown[key] = preview
+                if pcd.has_points():
+                    if last_pcd is not None:
+                        self.vis.remove_geometry(last_pcd, reset_bounding_box=False)
+                    self.vis.add_geometry(pcd, reset_bounding_box=reset)
+                else:
+                    pcd = last_pcd
+                logging.debug(f"rendering live pcd and {len(shown)} chunks, {len(previews)} updated")
                 self.vis.update_renderer()
             await asyncio.sleep(5)
         self.vis.destroy_window()
         self.vis_task_alive.clear()
 
+    def _preview_levels(self, keys: list[ChunkKey]) -> list[int]:
+        """Finest LOD level for chunks near the drone, coarser further away"""
+        if self.chunks.position is None or not keys:
+            return [0] * len(keys)
+        centers = np.array(keys, dtype=np.float64) + self.CHUNK_SIZE / 2
+        distances = np.linalg.norm(centers - self.chunks.position, axis=1)
+        return np.searchsorted(self.PREVIEW_LOD_DISTANCES, distances).tolist()
+
+    def _chunk_previews(
+        self, keys: set[ChunkKey], shown: dict[ChunkKey, tuple[int, object]]
+    ) -> dict[ChunkKey, tuple[o3d.geometry.PointCloud, int, object]]:
+        """
+        Geometry for the chunks among keys whose LOD level or content differs from what shown has. Resident chunks
+        are downsampled from memory, the others are read from the stored pyramid levels.
+        """
+        previews: dict[ChunkKey, tuple[o3d.geometry.PointCloud, int, object]] = {}
+        ordered = list(keys)
+        for key, level in zip(ordered, self._preview_levels(ordered)):
+            chunk = self.chunks.peek(key)
+            arrays: dict[str, np.ndarray] | None
+            version: tuple[str, object]
+            if chunk is not None:
+                version = ("resident", chunk.version)
+                if shown.get(key) == (level, version):
+                    continue
+                arrays = self.store.from_point_cloud(chunk.pcd)
+                if level:
+                    arrays = self.lod.downsample(arrays, level)[-1]
+            else:
+                version = ("stored", self.lod.version(key, level))
+                if shown.get(key) == (level, version):
+                    continue
+                arrays = self.lod.read(key, level)
+                if arrays is None:
+                    continue
+            previews[key] = (self.store.to_point_cloud(arrays), level, version)
+        return previews
+
+    def query_region(self, min_bound, max_bound, stride: int = 1) -> dict[str, np.ndarray]:
+        """
+        Points and colors of the map inside [min_bound, max_bound), every stride-th point of each chunk, e.g. for
+        a box from region.bounds_from_gps. Safe to call while scanning: resident chunks are read from memory,
+        chunks waiting for the writer from their snapshot and the rest from the store. Frames still in the TSDF
+        volume are not part of any chunk until the next rollover.
+        """
+        min_bound = np.asarray(min_bound, dtype=np.float64)
+        max_bound = np.asarray(max_bound, dtype=np.float64)
+        parts = []
+        seen = set()
+        for key in set(self.chunks.keys()) | set(self.writer.pending_keys()):
+            if not chunk_intersects(key, self.CHUNK_SIZE, min_bound, max_bound):
+                continue
+            chunk = self.chunks.peek(key)
+            if chunk is not None:
+                # merges replace a chunk's point cloud rather than modify it, so this reference is a snapshot
+                pcd = chunk.pcd
+                part = crop_arrays(
+                    {"points": np.asarray(pcd.points), "colors": np.asarray(pcd.colors)}, min_bound, max_bound, stride
+                )
+                part = {
+                    "points": part["points"].astype(self.store.COLUMNS["points"][0]),
+                    "colors": np.rint(part["colors"] * 255).astype(self.store.COLUMNS["colors"][0]),
+                }
+            else:
+                # evicted since, the snapshot is pending or already written to the store
+                arrays = self.writer.pending(key)
+                if arrays is None:
+                    continue
+                part = crop_arrays(arrays, min_bound, max_bound, stride)
+            seen.add(key)
+            parts.append(part)
+        parts.append(query_store(self.store, min_bound, max_bound, stride, exclude=seen))
+        return concatenate(parts)
+
     @classmethod
     def combine_pcd(
         cls,
         box: o3d.geometry.AxisAlignedBoundingBox,
         source: o3d.geometry.PointCloud,
         target: o3d.geometry.PointCloud,
-    ) -> o3d.geometry.PointCloud:
-        result_icp = cls.pt2pt_pcd_combine(source, target)
-
+        target_weights: np.ndarray | None = None,
+        target_geometry: RegistrationTarget | None = None,
+        trusted: bool = False,
+        stats: MergeStats | None = None,
+    ) -> tuple[o3d.geometry.PointCloud, np.ndarray]:
+        """
+        Merge source into the target chunk, returning the merged points and their fusion weights.
+
+        With a trusted pose that already lines source up with the target (see aligned), both are fused
+        per voxel directly; otherwise source is registered against the target first.
+        target_geometry caches the target's KD-trees and normals, see Chunk.registration_target.
+        """
+        start = time.time()
+        if target_geometry is None:
+            target_geometry = RegistrationTarget(
+                np.asarray(target.points), np.asarray(target.normals) if target.has_normals() else None
+            )
+        if trusted and cls.aligned(source, target_geometry):
+            source = cls.filter_outliers(source, target_geometry, stats)
+            combined, weights = cls.fuse_pcd(box, (source, None), (target, target_weights))
+            if stats is not None:
+                stats.fast += 1
+                stats.latency.record(time.time() - start)
+            return combined, weights
+
+        result_icp = cls.pt2pt_pcd_combine(source, target_geometry)
         if result_icp:
             source: o3d.geometry.PointCloud = source.transform(result_icp.transformation)
-            combined: o3d.geometry.PointCloud = (source + target).crop(box)
+            source = cls.filter_outliers(source, target_geometry, stats)
+            combined, weights = cls.fuse_pcd(box, (source, None), (target, target_weights))
+            if stats is not None:
+                stats.registered += 1
         else:
             if np.asarray(target.points).size > np.asarray(source.points).size:
-                combined = target
+                combined, weights = cls.fuse_pcd(box, (target, target_weights))
             else:
-                combined = source
+                # not lined up with the target, its points are no reference
+                combined, weights = cls.fuse_pcd(box, (cls.filter_outliers(source, None, stats), None))
             logging.debug("failed to combine")
-        combine, _ = combined.remove_statistical_outlier(16, 3)
-        return combined.voxel_down_sample(voxel_size=cls.VOXEL_SIZE)
+            if stats is not None:
+                stats.failed += 1
+        if stats is not None:
+            stats.latency.record(time.time() - start)
+        return combined, weights
 
     @classmethod
-    def pt2pt_pcd_combine(cls, source, target):
-        result_icp: o3d.pipelines.registration.RegistrationResult
+    def filter_outliers(
+        cls, source: o3d.geometry.PointCloud, target: RegistrationTarget | None, stats: MergeStats | None = None
+    ) -> o3d.geometry.PointCloud:
+        """source without the points that are outliers among source and the target chunk it is merged into"""
+        start = time.time()
+        points = np.asarray(source.points)
+        inliers = incoming_inliers(
+            points, None if target is None else target.points, cls.OUTLIER_NEIGHBOURS, cls.OUTLIER_STD_RATIO
+        )
+        filtered = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points[inliers]))
+        if source.has_colors():
+            filtered.colors = o3d.utility.Vector3dVector(np.asarray(source.colors)[inliers])
+        if stats is not None:
+            stats.outliers_checked += points.shape[0]
+            stats.outliers_rejected += points.shape[0] - int(np.count_nonzero(inliers))
+            stats.outlier_latency.record(time.time() - start)
+        return filtered
+
+    @classmethod
+    def aligned(cls, source: o3d.geometry.PointCloud, target: RegistrationTarget) -> bool:
+        """
+        Whether source can be fused without registration: it barely overlaps the target (nothing to align to),
+        or the median distance of the overlapping points to the target is within ALIGNED_RESIDUAL.
+        """
+        points = np.asarray(source.points)
+        if not target.points.shape[0]:
+            return True
+        if points.shape[0] > cls.ALIGNMENT_SAMPLES:
+            points = points[:: -(-points.shape[0] // cls.ALIGNMENT_SAMPLES)]
+        distance, _ = target.query(points, cls.OVERLAP_DISTANCE)
+        overlapping = distance[np.isfinite(distance)]
+        if overlapping.shape[0] < cls.MIN_OVERLAP * points.shape[0]:
+            return True
+        return float(np.median(overlapping)) <= cls.ALIGNED_RESIDUAL
+
+    @classmethod
+    def fuse_pcd(
+        cls, box: o3d.geometry.AxisAlignedBoundingBox, *clouds: tuple[o3d.geometry.PointCloud, np.ndarray | None]
+    ) -> tuple[o3d.geometry.PointCloud, np.ndarray]:
+        """
+        Running per-voxel average of clouds with their weights (None is weight 1 per point), cropped to box.
+
+        Normals are carried along: voxels mostly made of points with normals (the chunk's) average them, only new
+        or mostly new voxels are estimated again, so a merge pays for the surface it added rather than the chunk.
+        """
+        point_parts, color_parts, weight_parts, normal_parts = [], [], [], []
+        for pcd, w in clouds:
+            point_parts.append(np.asarray(pcd.points))
+            color_parts.append(np.asarray(pcd.colors) if pcd.has_colors() else np.zeros_like(point_parts[-1]))
+            weight_parts.append(
+                np.ones(point_parts[-1].shape[0]) if w is None else np.asarray(w, dtype=np.float64).reshape(-1)
+            )
+            normal_parts.append(np.asarray(pcd.normals) if pcd.has_normals() else np.full_like(point_parts[-1], np.nan))
+        points, colors = np.concatenate(point_parts), np.concatenate(color_parts)
+        weights, normals = np.concatenate(weight_parts), np.concatenate(normal_parts)
+        inside = np.all((points >= box.min_bound) & (points < box.max_bound), axis=1)
+        points, colors, weights, fused_normals = fuse(
+            points[inside], colors[inside], weights[inside], cls.VOXEL_SIZE, cls.MAX_POINT_WEIGHT, normals[inside]
+        )
+        # fuse only leaves out normals it was not given
+        assert fused_normals is not None
+        normals = fused_normals
+        stale = np.isnan(normals[:, 0])
+        if stale.any():
+            normals[stale] = estimate_normals(points, cKDTree(points), subset=stale)
+        combined = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+        combined.colors = o3d.utility.Vector3dVector(colors)
+        combined.normals = o3d.utility.Vector3dVector(normals)
+        return combined, weights
+
+    @classmethod
+    def pt2pt_pcd_combine(
+        cls, source: o3d.geometry.PointCloud, target: RegistrationTarget
+    ) -> RegistrationResult | None:
         try:
-            result_icp = o3d.pipelines.registration.registration_icp(
-                source,
+            result = register(
+                np.asarray(source.points),
                 target,
-                max_correspondence_distance=1,
-                estimation_method=o3d.pipelines.registration.TransformationEstimationPointToPlane(
-                    o3d.pipelines.registration.TukeyLoss(cls.VOXEL_SIZE / 2)
-                ),
-                criteria=o3d.pipelines.registration.ICPConvergenceCriteria(
-                    relative_fitness=1e-8, relative_rmse=1e-8, max_iteration=3000
-                ),
+                cls.VOXEL_SIZE,
+                scales=cls.REGISTRATION_SCALES,
+                max_iterations=cls.REGISTRATION_ITERATIONS,
+                time_budget=cls.REGISTRATION_BUDGET,
             )
-            return result_icp
-        except:
+        except Exception as e:
+            logging.exception(e)
+            return None
+        if result is None:
+            return None
+        if (
+            result.scale != cls.REGISTRATION_SCALES[-1]
+            or result.fitness < cls.REGISTRATION_MIN_FITNESS
+            or result.inlier_rmse > cls.REGISTRATION_MAX_RMSE
+        ):
+            logging.debug(f"rejected registration {result.scale=} {result.fitness=} {result.inlier_rmse=}")
             return None
+        return result
 
     @classmethod
     def colored_pcd_combine(cls, source, target):
@@ -153,153 +566,344 @@ class ReconstructionVolume:
                 break
         return result_icp
 
-    async def add_image(self, rgbd_image: o3d.geometry.RGBDImage, extrinsic: np.ndarray):
+    async def add_image(
+        self,
+        rgbd_image: o3d.geometry.RGBDImage,
+        extrinsic: np.ndarray,
+        extrinsic_inv: np.ndarray | None = None,
+        quality: GPSQuality | None = None,
+        sensor: str = DEFAULT_SENSOR,
+    ):
+        """
+        Queue an image for the integration worker of sensor.
+        extrinsic is the camera pose; pass its inverse if already known (e.g. from create_rigid_transform).
+        quality is the fix the pose came from, surfaces only get merged without registration if every image
+        integrated since the last rollover had a trusted fix.
+        """
         if not self.active:
             return
-        try:
-            extrinsic = np.linalg.inv(extrinsic)
-        except LinAlgError:
-            logging.error("Image Extrinsic not invertible")
-            return
-        self.volume.integrate(rgbd_image, self.INTRINSICS, extrinsic)
-        self.num_images += 1
-        if self.num_images >= self.IMAGE_THRESHOLD:
-            await self.rollover()
-
-    async def rollover(self):
-        logging.info("reconstructor roll over")
-        start = time.time()
-        pc = self.volume.extract_point_cloud()
-        logging.info(f"rollover time:{time.time() - start}")
-        await self.pcd_queue.put(pc)
-        self.num_images = 0
-        self.volume.reset()
+        integrator = self.sensors[sensor]
+        if extrinsic_inv is None:
+            try:
+                extrinsic_inv = np.linalg.inv(extrinsic)
+            except LinAlgError:
+                logging.error("Image Extrinsic not invertible")
+                return
+        item = (time.time(), rgbd_image, extrinsic, extrinsic_inv, quality in self.TRUSTED_QUALITIES)
+        if self.drop_policy == "block":
+            await asyncio.to_thread(integrator.queue.put, item)
+        else:
+            try:
+                integrator.queue.put_nowait(item)
+            except queue.Full:
+                if self.drop_policy == "drop_oldest":
+                    # the worker only takes items out, so there is room after this
+                    try:
+                        integrator.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    integrator.queue.put_nowait(item)
+                integrator.stats.dropped += 1
+        integrator.stats.queue_depth = integrator.queue.qsize()
+
+    def rollover_due(self, sensor: SensorIntegrator) -> bool:
+        """
+        Once the sensor's TSDF uses its share of the memory budget, so hovering does not roll over tiny volumes
+        and fast sweeps do not outgrow memory. Every IMAGE_THRESHOLD images for backends that do not report
+        their use.
+        """
+        self.memory_stats.tsdf = self._tsdf_bytes()
+        if sensor.used_bytes is None:
+            return sensor.num_images >= self.IMAGE_THRESHOLD
+        if sensor.num_images < self.MIN_ROLLOVER_IMAGES:
+            return False
+        return sensor.used_bytes >= self.memory_stats.budget * self.TSDF_BUDGET_FRACTION / len(self.sensors)
+
+    def _tsdf_bytes(self) -> int | None:
+        total = 0
+        for sensor in self.sensors.values():
+            if sensor.used_bytes is None:
+                return None
+            total += sensor.used_bytes
+        return total
+
+    def _chunks_over_budget(self) -> bool:
+        """Whether the resident chunks use more than what the TSDF leaves of the memory budget."""
+        self.memory_stats.chunks = self.chunks.memory_bytes()
+        tsdf = self.memory_stats.tsdf or 0
+        return self.memory_stats.chunks + tsdf > self.memory_stats.budget
+
+    def _extract_point_cloud(self) -> o3d.geometry.PointCloud:
+        clouds = [sensor.extract_point_cloud() for sensor in self.sensors.values()]
+        if len(clouds) == 1:
+            return clouds[0]
+        pcd = o3d.geometry.PointCloud()
+        for cloud in clouds:
+            pcd += cloud
+        return pcd
+
+    async def rollover(self, sensor: SensorIntegrator | None = None):
+        """Hand the surface fused since the last rollover of sensor, or of every sensor, to chunk merging"""
+        for integrator in self.sensors.values() if sensor is None else (sensor,):
+            logging.info(f"reconstructor roll over of {integrator.name}")
+            start = time.time()
+            pc = await asyncio.to_thread(integrator.flush)
+            logging.info(f"rollover time:{time.time() - start}")
+            await self.pcd_queue.put((pc, integrator.untrusted_images == 0))
+            integrator.num_images = 0
+            integrator.untrusted_images = 0
 
     async def close(self):
         self.active = False
+        # integrate what is still queued, then flush it; process_pcd_task merges every rollover up to the sentinel,
+        # including the ones the workers trigger while draining their queues, so their pcd_queue puts do not block
+        await asyncio.gather(*(sensor.close() for sensor in self.sensors.values()))
         await self.rollover()
+        await self.pcd_queue.put(None)
         while (
             self.process_pcd_task_alive.is_set()
             or self.write_to_disk_task_alive.is_set()
             or self.vis_task_alive.is_set()
         ):
             await asyncio.sleep(0.1)
+        self.merges.shutdown()
+        if self.merge_processes is not None:
+            self.merge_processes.shutdown()
+        self.writer.shutdown()
+        self.lod.flush()
         logging.info("reconstructor closed, all files saved to disk.")
 
-    def _slice_point_cloud(self, pc: o3d.geometry.PointCloud):
-        min_box_coords = pc.get_min_bound()
-        max_box_coords = pc.get_max_bound()
-
-        rounded_mins = np.floor(min_box_coords / self.CHUNK_SIZE) * self.CHUNK_SIZE
-        rounded_mins = rounded_mins.astype(np.int64)
-        rounded_maxes = np.ceil(max_box_coords / self.CHUNK_SIZE) * self.CHUNK_SIZE
-        rounded_maxes = rounded_maxes.astype(np.int64)
+    def _chunk_box(self, key: ChunkKey) -> o3d.geometry.AxisAlignedBoundingBox:
+        min_bound = np.array(key, dtype=np.float64)
+        return o3d.geometry.AxisAlignedBoundingBox(min_bound, min_bound + self.CHUNK_SIZE)
 
-        logging.debug(f"MIN X: {rounded_mins[0]}, MAX X: {rounded_maxes[0]}")
+    def _merge_chunk(self, key: ChunkKey, points: np.ndarray, colors: np.ndarray, trusted: bool = False):
+        box = self._chunk_box(key)
+        cropped_points = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+        cropped_points.colors = o3d.utility.Vector3dVector(colors)
 
-        def process_sliced_point_cloud(
-            pc: o3d.geometry.PointCloud, box: o3d.geometry.AxisAlignedBoundingBox, _x, _y, _z
-        ):
-            cropped_points = pc.crop(box)
-            cropped_array = np.asarray(cropped_points.points)
-            if not (cropped_array.size and cropped_array.ndim):
-                return
+        while (chunk := self.chunks.get(key)) is not None:
+            with chunk.lock:
+                # evicted while waiting for the lock, its snapshot is now pending with the writer
+                if chunk.evicted:
+                    continue
+                chunk.update(*self._combine(box, cropped_points, chunk, trusted), self.VOXEL_SIZE)
+                logging.debug(f"combined in memory {chunk}")
+            self._preview_changed(key)
+            return
 
-            chunk = self.chunks.get((_x, _y, _z), None)
-            if chunk is not None:
-                with chunk.lock:
-                    chunk.pcd = self.combine_pcd(box, cropped_points, chunk.pcd)
-                    logging.debug(f"combined in memory {chunk}")
+        try:
+            snapshot = self.writer.pending(key)
+            arrays = self.store.read_arrays(key) if snapshot is None else snapshot
+            if arrays is None:
+                chunk = self._new_chunk(box, cropped_points)
+                reloaded = False
             else:
-                pcd_file = self._file_for_pcd((_x, _y, _z))
-                try:
-                    if not Path(pcd_file).exists():
-                        raise FileNotFoundError
-                    old_chunk: o3d.geometry.PointCloud = o3d.io.read_point_cloud(pcd_file)
-                    if not old_chunk.has_points():
-                        raise FileNotFoundError
-                    chunk = Chunk(self.combine_pcd(box, cropped_points, old_chunk))
-                    logging.debug(f"combined from disk {chunk}")
-                except FileNotFoundError:
-                    chunk = Chunk(cropped_points)
-                except Exception as e:
-                    logging.exception(e)
-                # Since the file will either be in memory or is unreadable/nonexistent, always try to remove it
-                try:
-                    os.remove(pcd_file)
-                except FileNotFoundError:
-                    pass
-                self.chunks[(_x, _y, _z)] = chunk
-
-        with ThreadPoolExecutor() as exe:
-            for x in range(rounded_mins[0], rounded_maxes[0], self.CHUNK_SIZE):
-                for y in range(rounded_mins[1], rounded_maxes[1], self.CHUNK_SIZE):
-                    for z in range(rounded_mins[2], rounded_maxes[2], self.CHUNK_SIZE):
-                        box = o3d.geometry.AxisAlignedBoundingBox(
-                            np.array([[x], [y], [z]]),
-                            np.array(
-                                [
-                                    [x + self.CHUNK_SIZE],
-                                    [y + self.CHUNK_SIZE],
-                                    [z + self.CHUNK_SIZE],
-                                ]
-                            ),
-                        )
-                        exe.submit(process_sliced_point_cloud, pc, box, x, y, z)
+                old_chunk = Chunk(self.store.to_point_cloud(arrays), arrays.get("weights"))
+                chunk = Chunk(*self._combine(box, cropped_points, old_chunk, trusted))
+                reloaded = True
+                logging.debug(f"combined from disk {chunk}")
+        except Exception as e:
+            logging.exception(e)
+            chunk = self._new_chunk(box, cropped_points)
+            reloaded = False
+        # the file on disk stays until the chunk is evicted and rewritten, it is the last persisted state
+        self.chunks.put(key, chunk, reloaded)
+        self._preview_changed(key)
+
+    def _new_chunk(self, box: o3d.geometry.AxisAlignedBoundingBox, source: o3d.geometry.PointCloud) -> Chunk:
+        """a chunk seen for the first time, filtered and fused like a merge so it starts with weights and normals"""
+        return Chunk(*self.fuse_pcd(box, (self.filter_outliers(source, None, self.merge_stats), None)))
+
+    def _combine(
+        self, box: o3d.geometry.AxisAlignedBoundingBox, source: o3d.geometry.PointCloud, target: Chunk, trusted: bool
+    ) -> tuple[o3d.geometry.PointCloud, np.ndarray]:
+        if self.merge_processes is None:
+            return self.combine_pcd(
+                box, source, target.pcd, target.weights, target.registration_target(), trusted, self.merge_stats
+            )
+        return self._combine_in_process(box, source, target, trusted)
+
+    def _combine_in_process(
+        self, box: o3d.geometry.AxisAlignedBoundingBox, source: o3d.geometry.PointCloud, target: Chunk, trusted: bool
+    ) -> tuple[o3d.geometry.PointCloud, np.ndarray]:
+        """combine_pcd in a merge process; the worker rebuilds the target's KD-trees, they are not shared"""
+        assert self.merge_processes is not None
+        start = time.time()
+        source_count, target_count = len(source.points), len(target.pcd.points)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, merge_buffer_size(source_count, target_count)))
+        views = merge_buffer_views(shm.buf, source_count, target_count)
+        try:
+            views["source_points"][:] = np.asarray(source.points)
+            views["source_colors"][:] = np.asarray(source.colors)
+            views["target_points"][:] = np.asarray(target.pcd.points)
+            views["target_colors"][:] = np.asarray(target.pcd.colors)
+            views["target_weights"][:] = 1 if target.weights is None else np.reshape(target.weights, (-1, 1))
+            views["target_normals"][:] = np.asarray(target.pcd.normals) if target.pcd.has_normals() else np.nan
+            count, fast, registered, failed, checked, rejected, outlier_time = self.merge_processes.submit(
+                _merge_shared, shm.name, source_count, target_count, box.min_bound, box.max_bound, trusted
+            ).result()
+            combined = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(views["result_points"][:count]))
+            combined.colors = o3d.utility.Vector3dVector(views["result_colors"][:count])
+            combined.normals = o3d.utility.Vector3dVector(views["result_normals"][:count])
+            weights = views["result_weights"][:count, 0].copy()
+        finally:
+            # the views export the buffer, it cannot be closed while they exist
+            del views
+            shm.close()
+            shm.unlink()
+        self.merge_stats.fast += fast
+        self.merge_stats.registered += registered
+        self.merge_stats.failed += failed
+        self.merge_stats.outliers_checked += checked
+        self.merge_stats.outliers_rejected += rejected
+        if checked:
+            self.merge_stats.outlier_latency.record(outlier_time)
+        self.merge_stats.latency.record(time.time() - start)
+        return combined, weights
+
+    def _slice_point_cloud(self, pc: o3d.geometry.PointCloud, trusted: bool = False) -> list[Future]:
+        """Schedule the merge of each chunk's share of pc, see MergeScheduler"""
+        points = np.asarray(pc.points)
+        if not points.size:
+            return []
+        colors = np.asarray(pc.colors) if pc.has_colors() else np.zeros_like(points)
+
+        # group points by chunk in one pass: sort by chunk index, then split at the index changes,
+        # so every non-empty chunk gets a contiguous slice and empty chunks are never visited
+        indices = np.floor_divide(points, self.CHUNK_SIZE).astype(np.int64)
+        order = np.lexsort(indices.T)
+        indices = indices[order]
+        points = points[order]
+        colors = colors[order]
+        starts = np.flatnonzero(np.any(indices[1:] != indices[:-1], axis=1)) + 1
+        starts = np.concatenate(([0], starts))
+        ends = np.append(starts[1:], indices.shape[0])
+        keys = indices[starts] * self.CHUNK_SIZE
+
+        logging.debug(f"slicing {points.shape[0]} points into {keys.shape[0]} chunks")
+
+        futures = []
+        for key, start, end in zip(keys, starts, ends):
+            key = tuple(key.tolist())
+            future = self.merges.submit(key, self._merge_chunk, key, points[start:end], colors[start:end], trusted)
+            future.add_done_callback(self._log_merge_failure)
+            futures.append(future)
         logging.debug("done slicing point cloud")
+        return futures
+
+    @staticmethod
+    def _log_merge_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("failed to merge chunk", exc_info=future.exception())
+
+    async def _wait_rollovers(self, keep: int):
+        while len(self.pending_rollovers) > keep:
+            futures = self.pending_rollovers.popleft()
+            if futures:
+                await asyncio.wait([asyncio.wrap_future(f) for f in futures])
 
     async def process_pcd_task(self):
         if self.process_pcd_task_alive.is_set():
             return
         try:
             self.process_pcd_task_alive.set()
-            while self.active or not self.pcd_queue.empty():
+            while (item := await self.pcd_queue.get()) is not None:
+                pcd, trusted = item
                 try:
-                    pcd = await asyncio.wait_for(self.pcd_queue.get(), 1)
-                except TimeoutError:
-                    continue
-                try:
-                    await asyncio.to_thread(self._slice_point_cloud, pcd)
+                    self.pending_rollovers.append(await asyncio.to_thread(self._slice_point_cloud, pcd, trusted))
                 except Exception as e:
                     logging.exception(e)
+                await self._wait_rollovers(self.MAX_PENDING_ROLLOVERS - 1)
+            await self._wait_rollovers(0)
         finally:
             logging.debug("finish process pcd task")
             self.process_pcd_task_alive.clear()
 
-    def _file_for_pcd(self, index: tuple[int, int, int]) -> str:
-        return (self.output / f"chunk_{index[0]}_{index[1]}_{index[2]}.pcd").absolute().as_posix()
-
     async def write_to_disk_task(self):
         if self.write_to_disk_task_alive.is_set():
             return
         try:
             self.write_to_disk_task_alive.set()
-            while self.active or self.process_pcd_task_alive.is_set() or len(self.chunks.keys()):
-                if len(self.chunks.keys()) < self.IN_MEMORY_CHUNKS and self.process_pcd_task_alive.is_set():
+            while self.active or self.process_pcd_task_alive.is_set() or len(self.chunks):
+                if (
+                    len(self.chunks) < self.IN_MEMORY_CHUNKS
+                    and not self._chunks_over_budget()
+                    and self.process_pcd_task_alive.is_set()
+                ):
                     await asyncio.sleep(0.1)
                     continue
-                try:
-                    key, chunk = next(iter(self.chunks.items()))
-                except StopIteration:
+                candidate = self.chunks.eviction_candidate()
+                if candidate is None:
                     await asyncio.sleep(0.1)
                     continue
-
-                with chunk.lock:
-                    logging.debug(f"writing to disk: {self._file_for_pcd(key)}")
-                    o3d.io.write_point_cloud(
-                        self._file_for_pcd(key),
-                        chunk.pcd,
-                        format="pcd",
-                        write_ascii=False,
-                        compressed=True,
-                    )
-                    del self.chunks[key]
+                key, chunk = candidate
+                if self.writer.full() or not chunk.lock.acquire(blocking=False):
+                    # writer backlog, or the chunk is being merged (it will not be the LRU candidate afterwards)
+                    await asyncio.sleep(0.01)
+                    continue
+                try:
+                    # snapshot under the lock, the write itself happens on the writer pool
+                    logging.debug(f"writing to disk: {self.store.path_for(key)}")
+                    self.writer.submit(key, self.store.from_point_cloud(chunk.pcd, chunk.weights))
+                    chunk.evicted = True
+                    self.chunks.evict(key)
+                finally:
+                    chunk.lock.release()
                 await asyncio.sleep(0)
+            await self.writer.drain()
         finally:
             logging.debug("finish write to disk task")
             self.write_to_disk_task_alive.clear()
 
 
+def _merge_shared(
+    name: str, source_count: int, target_count: int, min_bound: np.ndarray, max_bound: np.ndarray, trusted: bool
+) -> tuple[int, int, int, int, int, int, float]:
+    """
+    ReconstructionVolume.combine_pcd in a merge worker process over a merge_buffer_views buffer, the result is
+    written back into it. Returns the result's point count, the MergeStats outcome and outlier counts, and the
+    time spent filtering outliers.
+    """
+    # spawned workers share the parent's resource tracker, which forgets the buffer when the parent unlinks it
+    shm = shared_memory.SharedMemory(name=name)
+    views = merge_buffer_views(shm.buf, source_count, target_count)
+    try:
+        source = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(views["source_points"]))
+        source.colors = o3d.utility.Vector3dVector(views["source_colors"])
+        target = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(views["target_points"]))
+        target.colors = o3d.utility.Vector3dVector(views["target_colors"])
+        if target_count and not np.isnan(views["target_normals"][0, 0]):
+            target.normals = o3d.utility.Vector3dVector(views["target_normals"])
+        stats = MergeStats()
+        combined, weights = ReconstructionVolume.combine_pcd(
+            o3d.geometry.AxisAlignedBoundingBox(min_bound, max_bound),
+            source,
+            target,
+            views["target_weights"],
+            None,
+            trusted,
+            stats,
+        )
+        count = len(combined.points)
+        views["result_points"][:count] = np.asarray(combined.points)
+        views["result_colors"][:count] = np.asarray(combined.colors)
+        views["result_weights"][:count, 0] = weights
+        views["result_normals"][:count] = np.asarray(combined.normals)
+        return (
+            count,
+            stats.fast,
+            stats.registered,
+            stats.failed,
+            stats.outliers_checked,
+            stats.outliers_rejected,
+            stats.outlier_latency.total,
+        )
+    finally:
+        del views
+        shm.close()
+
+
 class CameraPose:
     def __init__(self, meta, mat):
         self.metadata = meta
@@ -333,7 +937,8 @@ async def main():
     ReconstructionVolume.INTRINSICS = o3d.camera.PinholeCameraIntrinsic(
         o3d.camera.PinholeCameraIntrinsicParameters.PrimeSenseDefault
     )
-    volume = ReconstructionVolume(output_dir)
+    # replaying a dataset, so wait for the worker instead of dropping frames
+    volume = ReconstructionVolume(output_dir, drop_policy="block")
     volume.start_visualization()
     for i in range(len(camera_poses) - 1):
         color = o3d.io.read_image(lounge_rgbd.color_paths[i])
@@ -345,7 +950,7 @@ async def main():
         await asyncio.sleep(0)
     await volume.close()
 
-    samples = [o3d.io.read_point_cloud(p) for p in output_dir.glob("*.pcd")]
+    samples = [volume.store.read(key) for key in volume.store.keys()]
     o3d.visualization.draw_geometries(
         samples,
         zoom=0.3412,
@@ -354,35 +959,19 @@ async def main():
         up=[-0.0694, -0.9768, 0.2024],
     )
 
-    # Convert point clouds into meshes
-    combined = o3d.geometry.PointCloud()
-    for sample in samples:
-        combined += sample
-    combined.estimate_normals()
-    mesh: o3d.geometry.TriangleMesh
-    mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(combined, depth=9)
-    mesh.remove_vertices_by_mask(densities < np.quantile(densities, 0.02))
-
-    # Visualize the generated meshes
-    o3d.visualization.draw_geometries(
-        [mesh],
-        zoom=0.3412,
-        front=[0.4257, -0.2125, -0.8795],
-        lookat=[2.6172, 2.0475, 1.532],
-        up=[-0.0694, -0.9768, 0.2024],
-    )
-
-    mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(
-        combined, o3d.utility.DoubleVector([0.005, 0.01, 0.02, 0.04, 0.08])
-    )
-
-    o3d.visualization.draw_geometries(
-        [mesh],
-        zoom=0.3412,
-        front=[0.4257, -0.2125, -0.8795],
-        lookat=[2.6172, 2.0475, 1.532],
-        up=[-0.0694, -0.9768, 0.2024],
-    )
+    # Convert point clouds into meshes, chunk by chunk
+    for method in ("poisson", "ball_pivoting"):
+        mesh_dir = output_dir.parent / f"mesh_{method}"
+        paths = export_meshes(
+            volume.store, mesh_dir, ReconstructionVolume.CHUNK_SIZE, skip_current=False, method=method
+        )
+        o3d.visualization.draw_geometries(
+            [o3d.io.read_triangle_mesh(path.as_posix()) for path in paths],
+            zoom=0.3412,
+            front=[0.4257, -0.2125, -0.8795],
+            lookat=[2.6172, 2.0475, 1.532],
+            up=[-0.0694, -0.9768, 0.2024],
+        )
 
 
 if __name__ == "__main__":
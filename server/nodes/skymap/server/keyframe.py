@@ -0,0 +1,59 @@
+import numpy as np
+
+from metrics import KeyframeStats
+
+
+class KeyframeSelector:
+    """
+    Picks the frames worth integrating: a frame is a keyframe once it moved min_translation meters or turned
+    min_rotation degrees about any axis since the last keyframe. While hovering, consecutive frames see the same
+    surface from the same pose and add nothing to the TSDF but integration time.
+
+    max_skipped bounds the frames skipped in a row, so a hovering drone still refreshes its surroundings;
+    None never forces a keyframe.
+    """
+
+    def __init__(self, min_translation: float = 0.1, min_rotation: float = 5.0, max_skipped: int | None = 30):
+        self.min_translation = min_translation
+        self.min_rotation = min_rotation
+        self.max_skipped = max_skipped
+        self.stats = KeyframeStats()
+        self._position: np.ndarray | None = None
+        self._orientation: np.ndarray | None = None
+        self._skipped = 0
+
+    def select(self, position: tuple[float, float, float], orientation: tuple[float, float, float]) -> bool:
+        """Whether the frame at ENU position with (yaw, pitch, roll) orientation in degrees is a keyframe."""
+        position = np.asarray(position, dtype=np.float64)
+        orientation = np.asarray(orientation, dtype=np.float64)
+        if self._position is not None and (self.max_skipped is None or self._skipped < self.max_skipped):
+            translation = np.linalg.norm(position - self._position)
+            # shortest angle between the two, across the +-180 degree wrap
+            rotation = np.abs((orientation - self._orientation + 180) % 360 - 180).max()
+            if translation < self.min_translation and rotation < self.min_rotation:
+                self._skipped += 1
+                self.stats.skipped += 1
+                return False
+        self._position = position
+        self._orientation = orientation
+        self._skipped = 0
+        self.stats.selected += 1
+        return True
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    fps = 30
+    # 20 s hover with GPS and attitude jitter, then a 20 s survey leg at 5 m/s
+    hover = rng.normal(scale=0.01, size=(20 * fps, 3))
+    leg = np.stack([np.arange(20 * fps) * 5 / fps, np.zeros(20 * fps), np.zeros(20 * fps)], axis=1)
+    positions = np.concatenate((hover, leg + hover[-1]))
+    orientations = rng.normal(scale=0.5, size=positions.shape) + (179.5, 0, 0)
+
+    selector = KeyframeSelector()
+    selected = np.array([selector.select(p, o) for p, o in zip(positions, orientations)])
+    print(f"hover: {selected[: 20 * fps].sum()} of {20 * fps} frames, leg: {selected[20 * fps :].sum()} of {20 * fps}")
+    print(f"skip rate {selector.stats.skip_rate():.0%}")
+    # only the forced refresh while hovering, every frame of the leg moves 0.17 m
+    assert selected[: 20 * fps].sum() <= 20 * fps // 30 + 1
+    assert selected[20 * fps + 1 :].all()
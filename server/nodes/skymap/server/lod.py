@@ -0,0 +1,85 @@
+import numpy as np
+
+from chunk_cache import ChunkKey
+from chunk_store import ChunkStore
+from voxel_fusion import fuse
+
+
+class LODPyramid:
+    """
+    Successively voxel-downsampled copies of every chunk for previews. Level 0 is the chunk itself, level i is
+    fused at VOXEL_SIZES[i - 1] from level i - 1 and stored in its own ChunkStore (lod1/, lod2/, ...) inside the
+    chunk store's directory.
+    """
+
+    VOXEL_SIZES = (0.08, 0.32, 1.28)
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.stores = [store]
+        self.stores += [ChunkStore(store.directory / f"lod{i}", store.read_only) for i in range(1, self.levels)]
+
+    @property
+    def levels(self) -> int:
+        return len(self.VOXEL_SIZES) + 1
+
+    @classmethod
+    def downsample(cls, arrays: dict[str, np.ndarray], levels: int | None = None) -> list[dict[str, np.ndarray]]:
+        """Columns of levels 1 to levels (default all) from the columns of a chunk."""
+        points = np.asarray(arrays["points"], dtype=np.float64)
+        colors = np.asarray(arrays["colors"], dtype=np.float64)
+        weights = np.ones(points.shape[0])
+        result = []
+        for voxel_size in cls.VOXEL_SIZES[:levels]:
+            points, colors, weights, _ = fuse(points, colors, weights, voxel_size)
+            result.append(
+                {
+                    "points": points.astype(ChunkStore.COLUMNS["points"][0]),
+                    "colors": np.rint(colors).astype(ChunkStore.COLUMNS["colors"][0]),
+                }
+            )
+        return result
+
+    def write(self, key: ChunkKey, arrays: dict[str, np.ndarray]):
+        """Rebuild the coarser levels of a chunk that was just written with arrays."""
+        for store, level in zip(self.stores[1:], self.downsample(arrays)):
+            store.write_arrays(key, level)
+
+    def read(self, key: ChunkKey, level: int) -> dict[str, np.ndarray] | None:
+        return self.stores[level].read_arrays(key)
+
+    def version(self, key: ChunkKey, level: int) -> float | None:
+        """Write time of a stored level, None if it was not written."""
+        entry = self.stores[level].manifest.get(key)
+        return None if entry is None else entry.modified
+
+    def flush(self):
+        """Save the pending manifest changes of every level, see ChunkManifest."""
+        for store in self.stores:
+            store.flush()
+
+    def remove(self, key: ChunkKey):
+        for store in self.stores[1:]:
+            store.remove(key)
+
+    def rebuild(self):
+        """Build the levels of every chunk, e.g. for scans written before the pyramid existed."""
+        for key in self.store.keys():
+            arrays = self.store.read_arrays(key)
+            if arrays is not None:
+                self.write(key, arrays)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Build the preview LOD pyramid of a chunk store.")
+    parser.add_argument("data_dir", type=Path, help="Path to the scan's chunk store")
+    args = parser.parse_args()
+
+    pyramid = LODPyramid(ChunkStore(args.data_dir))
+    pyramid.rebuild()
+    pyramid.flush()
+    for level, store in enumerate(pyramid.stores):
+        print(f"level {level}: {sum(entry.count for entry in store.manifest.entries())} points")
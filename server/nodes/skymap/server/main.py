@@ -12,8 +12,10 @@ import numpy as np
 import open3d as o3d
 import uvloop
 
-from gps_cartesian import ENUCoordinateSystem, create_transformation_matrix
+from gps_cartesian import ENUCoordinateSystem, create_rigid_transform
 from integrator import ReconstructionVolume
+from keyframe import KeyframeSelector
+from trajectory import HEADER_SIZE, TrajectoryWriter, load_trajectory
 from swarmnode_skymap_common import (
     cloudflare_turn,
     ZhouDepthEncoder,
@@ -32,9 +34,12 @@ from webrtc_proxy import (
 async def video_processor(
     mime_type: str,
     port_future: asyncio.Future[int],
-    frame_queue: asyncio.Queue[np.ndarray],
+    frame_queue: asyncio.Queue[tuple[float, np.ndarray]],
     scan_state: ScanState,
 ):
+    """Receive one sensor's frames into frame_queue, dropping the oldest when the reconstructor falls behind."""
+    # main() creates the scan directory before it starts the scan's tasks
+    assert scan_state.directory is not None
     frame_out_dir = scan_state.directory / "frames"
     frame_out_dir.mkdir(parents=True, exist_ok=True)
     frames_arr: list[np.ndarray] = []
@@ -42,12 +47,6 @@ async def video_processor(
     media_reader = webrtc_proxy_media_reader(mime_type)
     i = 0
 
-    vis = o3d.visualization.Visualizer()
-
-    trans = o3d.geometry.PointCloud.get_rotation_matrix_from_xzy([180, 0, 0])
-    pcd: o3d.geometry.PointCloud | None = None
-    decoder = ZhouDepthEncoder(depth_units, min_depth_meters, max_depth_meters)
-
     async with media_reader as media:
         port, pipeline = media
         port_future.set_result(port)
@@ -61,65 +60,157 @@ async def video_processor(
                         scan_state.last_client_frame_epoch_time = time.time()
                         scan_state.frames_received += 1
                         scan_state.status = ScanStateStatus.receiving
-                        # await frame_queue.put(frame)
-                        rgb, d, gps = decoder.video_frame_to_rgbd(frame)
-                        rgb_img = o3d.geometry.Image(np.ascontiguousarray(rgb))
-                        d_img = o3d.geometry.Image(np.ascontiguousarray(d))
-                        rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
-                            rgb_img,
-                            d_img,
-                            depth_scale=1 / depth_units,
-                            depth_trunc=max_depth_meters,
-                            convert_rgb_to_intensity=False,
-                        )
-
-                        new_pcd: o3d.geometry.PointCloud = o3d.geometry.PointCloud.create_from_rgbd_image(
-                            rgbd, ReconstructionVolume.INTRINSICS
-                        )
-                        new_pcd.rotate(trans)
-                        if pcd is None:
-                            vis.create_window()
-                            vis_ctrl: o3d.visualization.ViewControl = vis.get_view_control()
-                            vis_ctrl.set_zoom(1.5)
-                            pcd = new_pcd
-                            vis.add_geometry(pcd)
-                        else:
-                            pcd.points = new_pcd.points
-                            pcd.colors = new_pcd.colors
-                            vis.update_geometry(pcd)
-                            vis_ctrl.set_lookat(pcd.get_center())
-                        vis.poll_events()
-                        vis.update_renderer()
+                        if frame_queue.full():
+                            # the skipped sequence number counts it in ScanState.frames_dropped
+                            frame_queue.get_nowait()
+                        frame_queue.put_nowait((scan_state.last_client_frame_epoch_time, frame))
                         # frames_arr.append(frame)
                         # if len(frames_arr) >= 30:
                         #     await asyncio.to_thread(np.savez_compressed, frame_out_dir / f"{i}", *frames_arr)
                         #     i += 1
                         #     frames_arr = []
-                        await asyncio.sleep(0.01)
                 except asyncio.TimeoutError:
                     scan_state.status = ScanStateStatus.lost
         finally:
             if frames_arr:
                 np.savez_compressed(frame_out_dir / f"{i}", *frames_arr)
-            vis.destroy_window()
 
 
-async def reconstructor(frame_queue: asyncio.Queue[np.ndarray], scan_state: ScanState):
-    decoder = ZhouDepthEncoder(depth_units, min_depth_meters, max_depth_meters)
-    volume = ReconstructionVolume(scan_state.directory / "data")
+class FramePreview:
+    """A window showing the latest frame as a point cloud, fed the frames ingest already decoded."""
+
+    def __init__(self):
+        self.vis = o3d.visualization.Visualizer()
+        self.trans = o3d.geometry.PointCloud.get_rotation_matrix_from_xzy([180, 0, 0])
+        self.pcd: o3d.geometry.PointCloud | None = None
+
+    def show(self, rgbd: o3d.geometry.RGBDImage):
+        new_pcd: o3d.geometry.PointCloud = o3d.geometry.PointCloud.create_from_rgbd_image(
+            rgbd, ReconstructionVolume.INTRINSICS
+        )
+        new_pcd.rotate(self.trans)
+        if self.pcd is None:
+            self.vis.create_window()
+            vis_ctrl: o3d.visualization.ViewControl = self.vis.get_view_control()
+            vis_ctrl.set_zoom(1.5)
+            self.pcd = new_pcd
+            self.vis.add_geometry(self.pcd)
+        else:
+            self.pcd.points = new_pcd.points
+            self.pcd.colors = new_pcd.colors
+            self.vis.update_geometry(self.pcd)
+            self.vis.get_view_control().set_lookat(self.pcd.get_center())
+        self.vis.poll_events()
+        self.vis.update_renderer()
+
+    def close(self):
+        if self.pcd is not None:
+            self.vis.destroy_window()
+
+
+def trajectory_path(directory: Path, sensor: str, primary: bool) -> Path:
+    """The primary sensor's trajectory is trajectory.bin, which tools read for the scan's ENU origin."""
+    return directory / ("trajectory.bin" if primary else f"trajectory-{sensor}.bin")
+
+
+async def reconstructor(frame_queues: dict[str, asyncio.Queue[tuple[float, np.ndarray]]], scan_state: ScanState):
+    """Integrate the frames of every sensor, one frame queue each, into one map."""
+    assert scan_state.directory is not None
+    # TSDF backend for this scan, see tsdf.BACKENDS
+    backend = os.environ.get("SKYMAP_TSDF_BACKEND", "legacy")
+    logging.info(f"TSDF backend: {backend}")
+    # what to do with frames when integration falls behind, see ReconstructionVolume.DROP_POLICIES
+    drop_policy = os.environ.get("SKYMAP_INTEGRATION_DROP_POLICY", "drop_oldest")
+    # worker processes for chunk merges, 0 merges on threads in this process
+    merge_processes = int(os.environ.get("SKYMAP_MERGE_PROCESSES", "0"))
+    # memory for the TSDF volumes and resident chunks together, see ReconstructionVolume.MEMORY_BUDGET
+    memory_budget_mb = os.environ.get("SKYMAP_MEMORY_BUDGET_MB")
+    memory_budget = int(memory_budget_mb) * 2**20 if memory_budget_mb else None
+    # one preview window of the first sensor's frames, unless disabled with 0
+    preview = FramePreview() if os.environ.get("SKYMAP_FRAME_PREVIEW", "1") != "0" else None
+    sensors = list(frame_queues)
+    volume = ReconstructionVolume(
+        scan_state.directory / "data", backend, drop_policy, merge_processes, memory_budget, sensors
+    )
+    scan_state.chunk_cache = volume.chunks.stats
+    scan_state.chunk_writer = volume.writer.stats
+    scan_state.integration = {name: sensor.stats for name, sensor in volume.sensors.items()}
+    scan_state.merges = volume.merge_stats
+    scan_state.memory = volume.memory_stats
     # volume.start_visualization()
 
+    # one ENU origin for all sensors: the first pose of any of them, or the resumed scan's
     coord = ENUCoordinateSystem()
+    primary_trajectory = trajectory_path(scan_state.directory, sensors[0], primary=True)
+    if primary_trajectory.exists() and primary_trajectory.stat().st_size >= HEADER_SIZE:
+        # resumed scan, keep its ENU origin so new frames line up with the stored chunks
+        previous = load_trajectory(primary_trajectory)
+        scan_state.gps_origin = previous.origin
+        coord.set_enu_origin(*scan_state.gps_origin)
+        volume.resume(previous.records["extrinsic"][-1][:3, 3] if previous.records.shape[0] else None)
     try:
         scan_state.images_integrated = 0
+        async with asyncio.TaskGroup() as tg:
+            for i, (sensor, frame_queue) in enumerate(frame_queues.items()):
+                tg.create_task(
+                    ingest(sensor, i == 0, frame_queue, volume, coord, scan_state, preview if i == 0 else None)
+                )
+    finally:
+        await volume.close()
+        if preview is not None:
+            preview.close()
+
+
+async def ingest(
+    sensor: str,
+    primary: bool,
+    frame_queue: asyncio.Queue[tuple[float, np.ndarray]],
+    volume: ReconstructionVolume,
+    coord: ENUCoordinateSystem,
+    scan_state: ScanState,
+    preview: FramePreview | None = None,
+):
+    """Decode one sensor's frames and queue its keyframes for integration, showing every frame in preview."""
+    assert scan_state.directory is not None
+    decoder = ZhouDepthEncoder(depth_units, min_depth_meters, max_depth_meters)
+    # frames that barely moved from the last integrated one are skipped, see KeyframeSelector
+    keyframes = KeyframeSelector(
+        min_translation=float(os.environ.get("SKYMAP_KEYFRAME_TRANSLATION", "0.1")),
+        min_rotation=float(os.environ.get("SKYMAP_KEYFRAME_ROTATION", "5")),
+    )
+    scan_state.keyframes[sensor] = keyframes.stats
+    path = trajectory_path(scan_state.directory, sensor, primary)
+    trajectory: TrajectoryWriter | None = None
+    try:
         while True:
             await asyncio.sleep(0.01)
-            frame = await frame_queue.get()
-            rgb, d, gps = decoder.video_frame_to_rgbd(frame.copy())
+            arrival_time, frame = await frame_queue.get()
+            dequeued_time = time.time()
+            # off the event loop, so the sensors' frames decode in parallel
+            rgb, d, gps = await asyncio.to_thread(decoder.video_frame_to_rgbd, frame.copy())
             if gps is None:
                 scan_state.frames_corrupted += 1
                 continue
-            logging.info(gps)
+            scan_state.record_frame(
+                sensor, gps.frame_sequence, gps.capture_epoch_seconds, arrival_time, dequeued_time, time.time()
+            )
+            logging.debug(gps)
+
+            if not coord.has_origin():
+                scan_state.gps_origin = (gps.latitude, gps.longitude, gps.altitude)
+                coord.set_enu_origin(*scan_state.gps_origin)
+            if trajectory is None:
+                # set with the ENU origin, by this sensor above or by another one or a resumed scan before
+                assert scan_state.gps_origin is not None
+                trajectory = TrajectoryWriter(path, scan_state.gps_origin)
+            cartesian = coord.gps2enu(gps.latitude, gps.longitude, gps.altitude)
+            x, y, z = cartesian.item(0), cartesian.item(1), cartesian.item(2)
+            extrinsic, extrinsic_inv = create_rigid_transform(y, x, z, gps.yaw, gps.pitch, gps.roll)
+            # every decoded pose is logged, keyframe or not
+            trajectory.append(gps, (x, y, z), extrinsic)
+            keyframe = keyframes.select((x, y, z), (gps.yaw, gps.pitch, gps.roll))
+            if not keyframe and preview is None:
+                continue
             rgb_img = o3d.geometry.Image(np.ascontiguousarray(rgb))
             d_img = o3d.geometry.Image(np.ascontiguousarray(d))
             rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
@@ -129,17 +220,15 @@ async def reconstructor(frame_queue: asyncio.Queue[np.ndarray], scan_state: Scan
                 depth_trunc=max_depth_meters,
                 convert_rgb_to_intensity=False,
             )
-
-            if not coord.has_origin():
-                scan_state.gps_origin = (gps.latitude, gps.longitude, gps.altitude)
-                coord.set_enu_origin(*scan_state.gps_origin)
-            cartesian = coord.gps2enu(gps.latitude, gps.longitude, gps.altitude)
-            x, y, z = cartesian.item(0), cartesian.item(1), cartesian.item(2)
-            extrinsic = create_transformation_matrix(y, x, z, gps.yaw, gps.pitch, gps.roll)
-            await volume.add_image(rgbd, extrinsic)
-            scan_state.images_integrated += 1
+            if preview is not None:
+                preview.show(rgbd)
+            if not keyframe:
+                continue
+            await volume.add_image(rgbd, extrinsic, extrinsic_inv, gps.quality, sensor)
+            scan_state.images_integrated = sum(stats.integrated for stats in scan_state.integration.values())
     finally:
-        await volume.close()
+        if trajectory is not None:
+            trajectory.close()
 
 
 async def main(
@@ -148,11 +237,16 @@ async def main(
     tg: asyncio.TaskGroup,
     scan_state: ScanState,
 ):
-    rgbd_track = pb.NamedTrack(track_id="rgbd", stream_id="realsenseD455", mime_type="video/h265")
-    port_fut = asyncio.Future()
-    frame_queue = asyncio.Queue(maxsize=100)
-    tg.create_task(video_processor(rgbd_track.mime_type, port_fut, frame_queue, scan_state))
-    tg.create_task(reconstructor(frame_queue, scan_state))
+    # stream ids of the sensor arrays scanning together, each sends its own rgbd track
+    sensors = os.environ.get("SKYMAP_SENSORS", "realsenseD455").split(",")
+    rgbd_tracks = [pb.NamedTrack(track_id="rgbd", stream_id=sensor, mime_type="video/h265") for sensor in sensors]
+    port_futs: list[asyncio.Future[int]] = [asyncio.Future() for _ in rgbd_tracks]
+    frame_queues: dict[str, asyncio.Queue[tuple[float, np.ndarray]]] = {
+        sensor: asyncio.Queue(maxsize=100) for sensor in sensors
+    }
+    for track, port_fut in zip(rgbd_tracks, port_futs):
+        tg.create_task(video_processor(track.mime_type, port_fut, frame_queues[track.stream_id], scan_state))
+    tg.create_task(reconstructor(frame_queues, scan_state))
     target_state = pb.State(
         httpServerConfig=pb.HttpServer(
             address="localhost:11510",
@@ -161,7 +255,10 @@ async def main(
                 team_aud=os.environ["CLOUDFLARE_AUD"],
             ),
         ),
-        wantedTracks=[pb.MediaChannel(track=rgbd_track, localhost_port=await port_fut)],
+        wantedTracks=[
+            pb.MediaChannel(track=track, localhost_port=await port_fut)
+            for track, port_fut in zip(rgbd_tracks, port_futs)
+        ],
         config=pb.WebrtcConfig(ice_servers=[await cloudflare_turn()]),
     )
     await mutation_q.put(pb.Mutation(setState=target_state))
@@ -211,8 +308,20 @@ def configure_root_logger(log_dir: Path):
 
 async def scan_instance(scan_state: ScanState):
     try:
-        scan_state.id = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-        scan_state.directory = Path.home() / "skymap-server" / scan_state.id
+        scans_dir = Path.home() / "skymap-server"
+        # continue an interrupted scan (its id, or "latest") instead of starting a new one. Only the first scan of
+        # the process resumes, the scans started from the TUI after it are new
+        resume = os.environ.pop("SKYMAP_RESUME_SCAN", None)
+        if resume == "latest":
+            # ids are timestamps, they sort chronologically
+            resume = max((path.name for path in scans_dir.glob("*") if path.is_dir()), default=None)
+        if resume:
+            scan_state.id = resume
+            if not (scans_dir / resume).is_dir():
+                raise FileNotFoundError(f"no scan {resume!r} to resume in {scans_dir}")
+        else:
+            scan_state.id = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        scan_state.directory = scans_dir / scan_state.id
         scan_state.directory.mkdir(parents=True, exist_ok=True)
         log_dir = scan_state.directory / "logs"
         log_dir.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,176 @@
+import itertools
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import open3d as o3d
+
+from chunk_cache import ChunkKey
+from chunk_store import ChunkStore
+
+METHODS = ("poisson", "ball_pivoting")
+
+
+def mesh_path(directory: Path, key: ChunkKey) -> Path:
+    return directory / f"chunk_{key[0]}_{key[1]}_{key[2]}.ply"
+
+
+def load_with_halo(store: ChunkStore, key: ChunkKey, chunk_size: float, halo: float) -> o3d.geometry.PointCloud:
+    """
+    A chunk's points plus those of its neighbours within halo of its border, read through the memory maps.
+    Stored normals are included if every part has them.
+    """
+    min_bound = np.array(key, dtype=np.float64) - halo
+    max_bound = np.array(key, dtype=np.float64) + chunk_size + halo
+    points, colors, normals = [], [], []
+    for offset in itertools.product((-1, 0, 1), repeat=3):
+        neighbour = tuple(int(k + o * chunk_size) for k, o in zip(key, offset))
+        entry = store.manifest.get(neighbour)
+        # the manifest's bounds rule out most neighbours without opening them
+        if entry is None or np.any(entry.max_bound < min_bound) or np.any(entry.min_bound >= max_bound):
+            continue
+        arrays = store.read_arrays(neighbour)
+        if arrays is None:
+            continue
+        inside = np.all((arrays["points"] >= min_bound) & (arrays["points"] < max_bound), axis=1)
+        points.append(arrays["points"][inside])
+        colors.append(arrays["colors"][inside])
+        normals.append(arrays["normals"][inside] if "normals" in arrays else None)
+    pcd = o3d.geometry.PointCloud()
+    if points:
+        pcd.points = o3d.utility.Vector3dVector(np.concatenate(points).astype(np.float64))
+        pcd.colors = o3d.utility.Vector3dVector(np.concatenate(colors) / 255)
+        if all(n is not None for n in normals):
+            pcd.normals = o3d.utility.Vector3dVector(np.concatenate(normals).astype(np.float64))
+    return pcd
+
+
+def crop_to_chunk(mesh: o3d.geometry.TriangleMesh, key: ChunkKey, chunk_size: float) -> o3d.geometry.TriangleMesh:
+    """Keep the triangles whose centroid is inside the chunk, so every triangle belongs to exactly one chunk."""
+    vertices = np.asarray(mesh.vertices)
+    triangles = np.asarray(mesh.triangles)
+    if not triangles.size:
+        return mesh
+    centroids = vertices[triangles].mean(axis=1)
+    min_bound = np.array(key, dtype=np.float64)
+    inside = np.all((centroids >= min_bound) & (centroids < min_bound + chunk_size), axis=1)
+    mesh.remove_triangles_by_mask(~inside)
+    mesh.remove_unreferenced_vertices()
+    return mesh
+
+
+def mesh_chunk(
+    store_directory: Path,
+    key: ChunkKey,
+    chunk_size: float,
+    output: Path,
+    halo: float = 0.5,
+    method: str = "poisson",
+    depth: int = 8,
+    density_quantile: float = 0.02,
+    voxel_size: float = 0.02,
+) -> int:
+    """
+    Mesh one chunk with a halo of neighbouring points, so the surface continues across its borders, then crop
+    it back to the chunk and write it to output. Returns the triangle count.
+    """
+    pcd = load_with_halo(ChunkStore(store_directory, read_only=True), key, chunk_size, halo)
+    if len(pcd.points) < 16:
+        return 0
+    if not pcd.has_normals():
+        # chunks written before normals were stored
+        pcd.estimate_normals(o3d.geometry.KDTreeSearchParamHybrid(radius=voxel_size * 4, max_nn=30))
+        # surveyed from above, surfaces face up
+        pcd.orient_normals_to_align_with_direction(np.array([0.0, 0.0, 1.0]))
+    if method == "poisson":
+        mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=depth)
+        densities = np.asarray(densities)
+        mesh.remove_vertices_by_mask(densities < np.quantile(densities, density_quantile))
+    elif method == "ball_pivoting":
+        radii = [voxel_size * f for f in (0.5, 1, 2, 4)]
+        mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(pcd, o3d.utility.DoubleVector(radii))
+    else:
+        raise ValueError(f"unknown meshing method {method!r}, expected one of {', '.join(METHODS)}")
+    mesh = crop_to_chunk(mesh, key, chunk_size)
+    o3d.io.write_triangle_mesh(output.as_posix(), mesh)
+    return len(mesh.triangles)
+
+
+def export_meshes(
+    store: ChunkStore,
+    directory: Path,
+    chunk_size: float,
+    max_workers: int | None = None,
+    skip_current: bool = True,
+    **options,
+) -> list[Path]:
+    """
+    Mesh every chunk of store into directory/chunk_x_y_z.ply, one process per chunk job.
+
+    At most max_workers jobs are in flight, so memory is bounded by a few chunks and their halos no matter
+    the size of the map. With skip_current, meshes newer than their chunk are kept, e.g. after an interrupted
+    export or a resumed scan. options are passed to mesh_chunk.
+    """
+    directory.mkdir(exist_ok=True, parents=True)
+    max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+    entries = store.manifest.entries()
+    written: list[Path] = []
+    in_flight: dict[Future, ChunkKey] = {}
+
+    def collect(futures):
+        for future in futures:
+            key = in_flight.pop(future)
+            try:
+                triangles = future.result()
+            except Exception as e:
+                logging.error(f"failed to mesh chunk {key}", exc_info=e)
+                continue
+            if triangles:
+                written.append(mesh_path(directory, key))
+            logging.debug(f"meshed chunk {key}: {triangles} triangles")
+
+    # spawn, Open3D is not fork safe
+    with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for entry in entries:
+            key = entry.key
+            output = mesh_path(directory, key)
+            if skip_current and output.exists() and output.stat().st_mtime >= entry.modified:
+                written.append(output)
+                continue
+            if len(in_flight) >= max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[pool.submit(mesh_chunk, store.directory, key, chunk_size, output, **options)] = key
+        collect(list(in_flight))
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mesh a chunk store chunk by chunk.")
+    parser.add_argument("data_dir", type=Path, help="Path to the scan's chunk store")
+    parser.add_argument("mesh_dir", type=Path, help="Where to write the .ply meshes")
+    parser.add_argument("--chunk-size", type=float, default=5)
+    parser.add_argument("--halo", type=float, default=0.5, help="Meters of neighbouring points meshed along")
+    parser.add_argument("--method", choices=METHODS, default="poisson")
+    parser.add_argument("--depth", type=int, default=8, help="Poisson octree depth per chunk")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Re-mesh chunks whose mesh is newer than the chunk")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG)
+    meshes = export_meshes(
+        ChunkStore(args.data_dir, read_only=True),
+        args.mesh_dir,
+        args.chunk_size,
+        max_workers=args.workers,
+        skip_current=not args.force,
+        halo=args.halo,
+        method=args.method,
+        depth=args.depth,
+    )
+    print(f"{len(meshes)} chunk meshes in {args.mesh_dir}")
@@ -0,0 +1,153 @@
+import bisect
+import dataclasses
+
+# seconds
+LATENCY_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+# frames missing between two consecutive received frames
+GAP_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_sparks = " ▁▂▃▄▅▆▇█"
+
+
+@dataclasses.dataclass
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds values <= bounds[i], the last bucket everything above."""
+
+    bounds: tuple[float, ...]
+    counts: list[int] = dataclasses.field(default_factory=list)
+    count: int = 0
+    total: float = 0.0
+    maximum: float | None = None
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def mean(self) -> float | None:
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket containing the q-quantile, capped at the largest recorded value."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.bounds + (self.maximum,), self.counts):
+            cumulative += n
+            if cumulative >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    @classmethod
+    def combined(cls, histograms: list["Histogram"], bounds: tuple[float, ...]) -> "Histogram":
+        """One histogram of the values of several with the same bounds."""
+        result = cls(bounds)
+        for histogram in histograms:
+            result.counts = [a + b for a, b in zip(result.counts, histogram.counts)]
+            result.count += histogram.count
+            result.total += histogram.total
+            if histogram.maximum is not None and (result.maximum is None or histogram.maximum > result.maximum):
+                result.maximum = histogram.maximum
+        return result
+
+    def sparkline(self) -> str:
+        peak = max(self.counts)
+        if not peak:
+            return ""
+        return "".join(_sparks[round(n / peak * (len(_sparks) - 1))] for n in self.counts)
+
+
+@dataclasses.dataclass
+class ChunkCacheStats:
+    resident: int = 0
+    # merges into a resident chunk
+    hits: int = 0
+    # merges into a chunk that was not resident
+    misses: int = 0
+    # misses that had to read the chunk back from disk
+    reloads: int = 0
+    evictions: int = 0
+
+
+@dataclasses.dataclass
+class ChunkWriterStats:
+    # snapshots submitted but not yet on disk
+    queue_depth: int = 0
+    writes: int = 0
+    # superseded by a newer snapshot of the same chunk before being written
+    skipped: int = 0
+    # dropped after ChunkWriter.MAX_ATTEMPTS failed writes
+    failed: int = 0
+    write_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+
+
+@dataclasses.dataclass
+class IntegrationStats:
+    # frames waiting for the integration worker
+    queue_depth: int = 0
+    integrated: int = 0
+    # frames discarded by the drop policy because the worker fell behind
+    dropped: int = 0
+    # time spent in TSDF integrate per frame
+    latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # time a frame waited in the queue
+    queue_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+
+    @classmethod
+    def combined(cls, stats: list["IntegrationStats"]) -> "IntegrationStats":
+        """Totals over several sensors."""
+        return cls(
+            queue_depth=sum(s.queue_depth for s in stats),
+            integrated=sum(s.integrated for s in stats),
+            dropped=sum(s.dropped for s in stats),
+            latency=Histogram.combined([s.latency for s in stats], LATENCY_BUCKETS),
+            queue_latency=Histogram.combined([s.queue_latency for s in stats], LATENCY_BUCKETS),
+        )
+
+
+@dataclasses.dataclass
+class KeyframeStats:
+    selected: int = 0
+    # frames with a pose too close to the last keyframe, not integrated
+    skipped: int = 0
+
+    def skip_rate(self) -> float | None:
+        total = self.selected + self.skipped
+        return self.skipped / total if total else None
+
+    @classmethod
+    def combined(cls, stats: list["KeyframeStats"]) -> "KeyframeStats":
+        return cls(selected=sum(s.selected for s in stats), skipped=sum(s.skipped for s in stats))
+
+
+@dataclasses.dataclass
+class MemoryStats:
+    # bytes the TSDF volume and resident chunks may use together, see ReconstructionVolume.MEMORY_BUDGET
+    budget: int = 0
+    # voxels in use by the TSDF volume, None if the backend does not report it
+    tsdf: int | None = None
+    # points, colors and weights of the resident chunks
+    chunks: int = 0
+
+
+@dataclasses.dataclass
+class MergeStats:
+    # fused without registration, the pose was trusted and lined up with the chunk
+    fast: int = 0
+    registered: int = 0
+    # registration failed, the larger of the two clouds was kept
+    failed: int = 0
+    latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # incoming points tested for outliers and rejected, see outliers.incoming_inliers
+    outliers_checked: int = 0
+    outliers_rejected: int = 0
+    outlier_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
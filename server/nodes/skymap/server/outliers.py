@@ -0,0 +1,51 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def incoming_inliers(
+    points: np.ndarray, target: np.ndarray | None, neighbours: int = 16, std_ratio: float = 3.0
+) -> np.ndarray:
+    """
+    Statistical outlier test of the points about to be merged into a chunk, the chunk's own points (target)
+    are not evaluated again. A point's mean distance to its nearest neighbours, among the incoming points and
+    the chunk, must be within std_ratio standard deviations of the mean over the incoming points.
+
+    Returns the mask of points to keep.
+    """
+    count = points.shape[0]
+    if count <= neighbours:
+        return np.ones(count, dtype=bool)
+    # one tree over both and one query is cheaper than querying the chunk's tree and the incoming points' separately
+    tree = cKDTree(points if target is None else np.concatenate((points, target)))
+    distances, _ = tree.query(points, neighbours + 1, workers=-1)
+    # each point is its own nearest neighbour
+    mean = distances[:, 1:].mean(axis=1)
+    return mean <= mean.mean() + std_ratio * mean.std()
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    voxel = 0.02
+    xs, ys = np.meshgrid(np.arange(0, 5, voxel), np.arange(0, 5, voxel))
+    chunk = np.stack([xs.ravel(), ys.ravel(), 0.3 * np.sin(xs.ravel())], axis=1)
+    incoming = chunk[rng.random(chunk.shape[0]) < 0.2] + rng.normal(scale=voxel / 4, size=(1, 3))
+    # depth speckle floating above the surface
+    speckle = rng.uniform((0, 0, 1), (5, 5, 3), size=(200, 3))
+    incoming = np.concatenate((incoming, speckle))
+
+    start = time.perf_counter()
+    inliers = incoming_inliers(incoming, chunk)
+    incremental_time = time.perf_counter() - start
+
+    # what filtering the whole merged chunk costs
+    start = time.perf_counter()
+    incoming_inliers(np.concatenate((chunk, incoming)), None)
+    full_time = time.perf_counter() - start
+
+    rejected = ~inliers
+    print(f"{incoming.shape[0]} incoming points into {chunk.shape[0]}: {rejected.sum()} rejected")
+    print(f"incoming only: {incremental_time * 1000:.1f} ms, whole chunk: {full_time * 1000:.1f} ms")
+    assert rejected[-speckle.shape[0] :].mean() > 0.9
+    assert rejected[: -speckle.shape[0]].mean() < 0.01
@@ -0,0 +1,109 @@
+import itertools
+from typing import Iterable
+
+import numpy as np
+import open3d as o3d
+
+from chunk_cache import ChunkKey
+from chunk_store import ChunkStore
+from gps_cartesian import ENUCoordinateSystem
+from trajectory import load_trajectory
+
+
+def bounds_from_gps(
+    coord: ENUCoordinateSystem, corner: Iterable[float], opposite: Iterable[float]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The reconstruction-frame box enclosing the region between two (latitude, longitude, height) corners.
+    The reconstruction's axes are north, east, up: reconstructor builds its extrinsics from (y, x, z) of ENU.
+    """
+    corners = np.array(list(itertools.product(*zip(corner, opposite))), dtype=np.float64)
+    enu = coord.gps2enu_batch(corners)
+    points = enu[:, [1, 0, 2]]
+    return points.min(axis=0), points.max(axis=0)
+
+
+def intersects(
+    min_bound: np.ndarray, max_bound: np.ndarray, box_min: Iterable[float], box_max: Iterable[float]
+) -> bool:
+    return bool(np.all(np.asarray(box_min) < max_bound) and np.all(np.asarray(box_max) >= min_bound))
+
+
+def chunk_intersects(key: ChunkKey, chunk_size: float, min_bound: np.ndarray, max_bound: np.ndarray) -> bool:
+    key = np.array(key, dtype=np.float64)
+    return intersects(min_bound, max_bound, key, key + chunk_size)
+
+
+def crop_arrays(
+    arrays: dict[str, np.ndarray], min_bound: np.ndarray, max_bound: np.ndarray, stride: int = 1
+) -> dict[str, np.ndarray]:
+    """
+    Points and colors of every stride-th row of arrays that lies inside [min_bound, max_bound). Memory-mapped
+    columns are only read at the rows the stride keeps.
+    """
+    points = np.asarray(arrays["points"][::stride])
+    colors = np.asarray(arrays["colors"][::stride])
+    inside = np.all((points >= min_bound) & (points < max_bound), axis=1)
+    return {"points": points[inside], "colors": colors[inside]}
+
+
+def concatenate(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """One set of columns from the parts of a query, empty columns if there are none."""
+    result = {}
+    for column in ("points", "colors"):
+        dtype, width = ChunkStore.COLUMNS[column]
+        arrays = [part[column] for part in parts]
+        result[column] = np.concatenate(arrays) if arrays else np.empty((0, width), dtype=dtype)
+    return result
+
+
+def query_store(
+    store: ChunkStore,
+    min_bound: Iterable[float],
+    max_bound: Iterable[float],
+    stride: int = 1,
+    exclude: set[ChunkKey] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Points and colors inside [min_bound, max_bound) of the chunks in store, except those in exclude.
+
+    Chunks are picked by their manifest bounds and read through memory maps, every stride-th point, so a query
+    only touches the chunks it overlaps. Safe to run against the store of a scan that is still being written: a
+    rewritten chunk is a new file set the manifest lists once complete, so a chunk's columns always match. A chunk
+    whose file set was retired since the manifest was read is left out.
+    """
+    min_bound = np.asarray(min_bound, dtype=np.float64)
+    max_bound = np.asarray(max_bound, dtype=np.float64)
+    parts = []
+    for entry in store.manifest.entries():
+        if exclude is not None and entry.key in exclude:
+            continue
+        if not intersects(min_bound, max_bound, entry.min_bound, entry.max_bound):
+            continue
+        arrays = store.read_arrays(entry.key)
+        if arrays is not None:
+            parts.append(crop_arrays(arrays, min_bound, max_bound, stride))
+    return concatenate(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Extract the points of a region from a chunk store.")
+    parser.add_argument("data_dir", type=Path, help="Path to the scan's chunk store")
+    parser.add_argument("output", type=Path, help="Where to write the region's points (.ply, .pcd, ...)")
+    parser.add_argument("--min", type=float, nargs=3, required=True, help="Lower corner, or latitude longitude height")
+    parser.add_argument("--max", type=float, nargs=3, required=True, help="Upper corner, or latitude longitude height")
+    parser.add_argument("--gps", action="store_true", help="Corners are GPS, relative to the scan's trajectory origin")
+    parser.add_argument("--stride", type=int, default=1, help="Keep every stride-th point")
+    args = parser.parse_args()
+
+    min_bound, max_bound = args.min, args.max
+    if args.gps:
+        coord = ENUCoordinateSystem()
+        coord.set_enu_origin(*load_trajectory(args.data_dir.parent / "trajectory.bin").origin)
+        min_bound, max_bound = bounds_from_gps(coord, args.min, args.max)
+    region = query_store(ChunkStore(args.data_dir, read_only=True), min_bound, max_bound, args.stride)
+    o3d.io.write_point_cloud(args.output.as_posix(), ChunkStore.to_point_cloud(region))
+    print(f"{region['points'].shape[0]} points between {min_bound} and {max_bound}")
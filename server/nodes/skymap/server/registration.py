@@ -0,0 +1,350 @@
+import time
+from typing import NamedTuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from voxel_fusion import average_normals, voxel_keys
+
+
+class RegistrationResult(NamedTuple):
+    # maps source points onto the target
+    transformation: np.ndarray
+    # fraction of source points with a correspondence at the finest scale
+    fitness: float
+    inlier_rmse: float
+    iterations: int
+    converged: bool
+    # finest scale ICP iterated at before time ran out
+    scale: float
+
+
+def voxel_down_sample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """Centroid of the points in each occupied voxel."""
+    return voxel_down_sample_normals(points, None, voxel_size)[0]
+
+
+def voxel_down_sample_normals(
+    points: np.ndarray, normals: np.ndarray | None, voxel_size: float
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """Centroid of the points in each occupied voxel, and the average of their normals, see average_normals."""
+    _, inverse, counts = np.unique(voxel_keys(points, voxel_size), return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    centroids = np.stack([np.bincount(inverse, weights=points[:, i]) for i in range(3)], axis=1) / counts[:, None]
+    if normals is None:
+        return centroids, None
+    return centroids, average_normals(inverse, normals)
+
+
+def estimate_normals(points: np.ndarray, tree: cKDTree, k: int = 16, subset: np.ndarray | None = None) -> np.ndarray:
+    """
+    Normals from the smallest principal axis of each point's k nearest neighbours, of points[subset] if given.
+    They are oriented up (surveyed from above); on vertical surfaces that is either side, so they are averaged
+    regardless of sign, see voxel_fusion.average_normals.
+    """
+    query = points if subset is None else points[subset]
+    k = min(k, points.shape[0])
+    _, idx = tree.query(query, k=k, workers=-1)
+    neighbours = points[idx.reshape(query.shape[0], k)]
+    centered = neighbours - neighbours.mean(axis=1, keepdims=True)
+    covariance = np.matmul(centered.transpose(0, 2, 1), centered)
+    # eigenvalues ascending, the first eigenvector is the normal; copied, the view would keep all three alive
+    normals = np.linalg.eigh(covariance)[1][:, :, 0].copy()
+    normals[normals[:, 2] < 0] *= -1
+    return normals
+
+
+class RegistrationTarget:
+    """
+    A chunk's points prepared as an ICP target. KD-trees and normals are built on first use, per scale, and
+    kept until the points change, so repeated merges into an unchanged chunk do not rebuild them. Normals
+    passed in (e.g. persisted with the chunk) are used as is, and averaged for the downsampled levels.
+
+    A merge mostly refines voxels the chunk already has, so updated() keeps the target as the base of the next
+    one and only prepares the points of new voxels; queries search both. points and normals list the base's
+    first.
+    """
+
+    def __init__(
+        self, points: np.ndarray, normals: np.ndarray | None = None, base: "RegistrationTarget | None" = None
+    ):
+        self.base = base
+        self._points = np.asarray(points, dtype=np.float64)
+        self._normals = normals
+        self._tree: cKDTree | None = None
+        self._levels: dict[float, RegistrationTarget] = {}
+        self._all_points: np.ndarray | None = None
+        self._all_normals: np.ndarray | None = None
+        self._keys: tuple[float, np.ndarray] | None = None
+
+    @property
+    def points(self) -> np.ndarray:
+        if self.base is None:
+            return self._points
+        if self._all_points is None:
+            self._all_points = np.concatenate((self.base.points, self._points))
+        return self._all_points
+
+    @property
+    def normals(self) -> np.ndarray:
+        if self._normals is None:
+            self._normals = estimate_normals(self._points, self.tree) if self._points.shape[0] else self._points
+        if self.base is None:
+            return self._normals
+        if self._all_normals is None:
+            self._all_normals = np.concatenate((self.base.normals, self._normals))
+        return self._all_normals
+
+    @property
+    def tree(self) -> cKDTree:
+        """Tree of the points not in the base."""
+        if self._tree is None:
+            self._tree = cKDTree(self._points)
+        return self._tree
+
+    def prepare(self) -> "RegistrationTarget":
+        """Build the normals and trees of this target and its bases now rather than on first use."""
+        _ = self.normals
+        target: RegistrationTarget | None = self
+        while target is not None:
+            _ = target.tree
+            target = target.base
+        return self
+
+    def nbytes(self, shared: tuple[np.ndarray, ...] = ()) -> int:
+        """
+        Memory of what the target prepared: its arrays, KD-trees, levels and bases. Arrays that may share memory with
+        one of shared, e.g. the chunk's own points and normals, are not counted again.
+        """
+        return self._nbytes(shared, set())
+
+    def _nbytes(self, shared: tuple[np.ndarray, ...], seen: set[int]) -> int:
+        # levels of an updated target have the base's levels as their bases, count each target once
+        if id(self) in seen:
+            return 0
+        seen.add(id(self))
+        arrays = [self._points, self._normals, self._all_points, self._all_normals]
+        if self._keys is not None:
+            arrays.append(self._keys[1])
+        if self._tree is not None:
+            # cKDTree keeps the points (unless it can use them as they are) and an index per point, its nodes
+            # take about 64 bytes each, one per 8 points with the default leafsize
+            arrays += [self._tree.data, self._tree.indices]
+        counted = list(shared)
+        size = 0
+        for array in arrays:
+            if array is None or any(np.may_share_memory(array, other) for other in counted):
+                continue
+            size += array.nbytes
+            counted.append(array)
+        if self._tree is not None:
+            size += self._tree.size * 64
+        # list, a merge may be adding levels meanwhile
+        size += sum(level._nbytes(shared, seen) for level in list(self._levels.values()))
+        if self.base is not None:
+            size += self.base._nbytes(shared, seen)
+        return size
+
+    def query(self, points: np.ndarray, distance_upper_bound: float) -> tuple[np.ndarray, np.ndarray]:
+        """Distance to and index in self.points of each point's nearest neighbour, cKDTree.query style."""
+        distance, idx = self.tree.query(points, distance_upper_bound=distance_upper_bound, workers=-1)
+        if self.base is None:
+            return distance, idx
+        base_distance, base_idx = self.base.query(points, distance_upper_bound)
+        closer = base_distance < distance
+        # missing neighbours keep index len(points), past the end of either
+        return np.where(closer, base_distance, distance), np.where(closer, base_idx, idx + self.base.points.shape[0])
+
+    def level(self, voxel_size: float | None) -> "RegistrationTarget":
+        """The target downsampled to voxel_size, None is full resolution."""
+        if voxel_size is None:
+            return self
+        if voxel_size not in self._levels:
+            points, normals = voxel_down_sample_normals(self._points, self._normals, voxel_size)
+            self._levels[voxel_size] = RegistrationTarget(
+                points, normals, None if self.base is None else self.base.level(voxel_size)
+            )
+        return self._levels[voxel_size]
+
+    def voxel_keys(self, voxel_size: float) -> np.ndarray:
+        """Sorted keys of the voxels of voxel_size the points occupy, see voxel_fusion.voxel_keys."""
+        if self._keys is None or self._keys[0] != voxel_size:
+            self._keys = (voxel_size, np.unique(voxel_keys(self.points, voxel_size)))
+        return self._keys[1]
+
+    def updated(
+        self,
+        points: np.ndarray,
+        normals: np.ndarray | None,
+        voxel_size: float,
+        max_added: float = 0.25,
+        max_removed: float = 0.05,
+    ) -> "RegistrationTarget":
+        """
+        The target of points, what the chunk this target was built from became after a merge. Fusion moves a voxel
+        by a fraction of voxel_size, so the voxels the unchanged part (the base) already has keep its trees,
+        levels and normals; only the points of new voxels are prepared. Once they exceed max_added of the base,
+        or more than max_removed of the base's voxels are gone (the chunk was replaced), it is rebuilt.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        base = self if self.base is None else self.base
+        base_keys = base.voxel_keys(voxel_size)
+        keys = voxel_keys(points, voxel_size)
+        known = _contains(base_keys, keys)
+        added = np.count_nonzero(~known)
+        removed = base_keys.shape[0] - np.count_nonzero(_contains(np.unique(keys[known]), base_keys))
+        if added > max_added * base_keys.shape[0] or removed > max_removed * base_keys.shape[0]:
+            return RegistrationTarget(points, normals)
+        return RegistrationTarget(points[~known], None if normals is None else normals[~known], base)
+
+
+def _contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Whether each of keys is in sorted_keys."""
+    if not sorted_keys.shape[0]:
+        return np.zeros(keys.shape[0], dtype=bool)
+    position = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.shape[0] - 1)
+    return sorted_keys[position] == keys
+
+
+def _small_rotation(omega: np.ndarray) -> np.ndarray:
+    """Rotation matrix of the rotation vector omega (Rodrigues)."""
+    angle = np.linalg.norm(omega)
+    if angle < 1e-12:
+        return np.eye(3)
+    axis = omega / angle
+    k = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * (k @ k)
+
+
+def register(
+    source: np.ndarray,
+    target: RegistrationTarget,
+    voxel_size: float,
+    scales: tuple[float, ...] = (4, 2, 1),
+    max_iterations: int = 30,
+    time_budget: float | None = None,
+    tolerance: float = 1e-5,
+    min_correspondences: int = 30,
+    max_source_points: int = 20000,
+    init: np.ndarray | None = None,
+) -> RegistrationResult | None:
+    """
+    Coarse-to-fine point-to-plane ICP with a Tukey robust kernel.
+
+    Each scale downsamples both clouds to scale * voxel_size (scale 1 uses the target at full resolution)
+    and runs at most max_iterations Gauss-Newton steps with correspondences up to 2 * scale * voxel_size
+    away, stopping early once the update is below tolerance. Source points beyond max_source_points are
+    subsampled evenly, six degrees of freedom do not need more. Once time_budget seconds of iterating have
+    passed the current estimate is returned, its scale tells whether the finest scale was reached. Preparing
+    the target's trees and normals is not counted: it is done once per chunk and kept (see RegistrationTarget),
+    a chunk loaded without normals would otherwise spend the budget on it and never reach the finest scale.
+    Returns None if a scale finds too few correspondences, or if time ran out before the first iteration.
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    transformation = np.eye(4) if init is None else init.copy()
+    source = np.asarray(source, dtype=np.float64)
+    iterations = 0
+    converged = False
+    fitness = 0.0
+    rmse = 0.0
+    reached = None
+    for scale in scales:
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        resolution = scale * voxel_size
+        source_level = voxel_down_sample(source, resolution) if scale > 1 else source
+        if source_level.shape[0] > max_source_points:
+            source_level = source_level[:: -(-source_level.shape[0] // max_source_points)]
+        preparation = time.perf_counter()
+        target_level = target.level(resolution if scale > 1 else None)
+        # built on first use and cached, not counted against the budget
+        target_normals = target_level.prepare().normals
+        if deadline is not None:
+            deadline += time.perf_counter() - preparation
+        max_distance = 2 * resolution
+        # Tukey's biweight, residuals beyond kernel get no weight
+        kernel = resolution / 2
+        converged = False
+        for _ in range(max_iterations):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            rotation, translation = transformation[:3, :3], transformation[:3, 3]
+            moved = source_level @ rotation.T + translation
+            distance, idx = target_level.query(moved, max_distance)
+            valid = np.isfinite(distance)
+            if np.count_nonzero(valid) < min_correspondences:
+                return None
+            p = moved[valid]
+            q = target_level.points[idx[valid]]
+            n = target_normals[idx[valid]]
+            residual = np.einsum("ij,ij->i", p - q, n)
+            weight = np.square(1 - np.square(np.minimum(np.abs(residual) / kernel, 1)))
+
+            jacobian = np.hstack((np.cross(p, n), n))
+            hessian = jacobian.T @ (jacobian * weight[:, None])
+            gradient = jacobian.T @ (weight * residual)
+            try:
+                update = np.linalg.solve(hessian, -gradient)
+            except np.linalg.LinAlgError:
+                return None
+            step = np.eye(4)
+            step[:3, :3] = _small_rotation(update[:3])
+            step[:3, 3] = update[3:]
+            transformation = step @ transformation
+            iterations += 1
+            reached = scale
+
+            fitness = np.count_nonzero(valid) / valid.shape[0]
+            rmse = float(np.sqrt(np.mean(np.square(residual))))
+            if np.linalg.norm(update) < tolerance:
+                converged = True
+                break
+    if reached is None:
+        return None
+    return RegistrationResult(transformation, fitness, rmse, iterations, converged, reached)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    voxel = 0.02
+
+    # a 5 m chunk of rolling terrain with a wall, sampled at the TSDF voxel size
+    xs, ys = np.meshgrid(np.arange(0, 5, voxel), np.arange(0, 5, voxel))
+    ground = np.stack([xs.ravel(), ys.ravel(), 0.3 * np.sin(xs.ravel()) * np.cos(ys.ravel() / 2)], axis=1)
+    zs, ys_wall = np.meshgrid(np.arange(0, 2, voxel), np.arange(0, 5, voxel))
+    wall = np.stack([np.full(zs.size, 2.5), ys_wall.ravel(), zs.ravel()], axis=1)
+    target_points = np.concatenate((ground, wall))
+
+    truth = np.eye(4)
+    truth[:3, :3] = _small_rotation(np.radians([0.5, -0.3, 1.0]))
+    truth[:3, 3] = (0.04, -0.03, 0.02)
+    # the source sees most of the chunk again, with sensor noise, displaced by the inverse of truth
+    source_points = target_points[rng.random(target_points.shape[0]) < 0.8]
+    source_points = source_points + rng.normal(scale=voxel / 4, size=source_points.shape)
+    inverse = np.linalg.inv(truth)
+    source_points = source_points @ inverse[:3, :3].T + inverse[:3, 3]
+
+    # a merge then adds a strip of new ground along the chunk, the updated target only prepares the strip
+    xs, ys = np.meshgrid(np.arange(5, 5.5, voxel), np.arange(0, 5, voxel))
+    strip = np.stack([xs.ravel(), ys.ravel(), 0.3 * np.sin(xs.ravel()) * np.cos(ys.ravel() / 2)], axis=1)
+    merged_points = np.concatenate((target_points, strip))
+
+    target = RegistrationTarget(target_points)
+    targets = {
+        "cold": lambda: target,
+        "cached": lambda: target,
+        "merged, rebuilt": lambda: RegistrationTarget(merged_points),
+        "merged, updated": lambda: target.updated(merged_points, None, voxel),
+    }
+    for label, make_target in targets.items():
+        start = time.perf_counter()
+        # no time budget, a loaded machine would stop it early and fail the check below, this only compares targets
+        result = register(source_points, make_target(), voxel)
+        elapsed = time.perf_counter() - start
+        error = np.linalg.norm(result.transformation[:3, 3] - truth[:3, 3])
+        print(
+            f"{label}: {elapsed * 1000:.0f} ms, {result.iterations} iterations, converged {result.converged}, "
+            f"fitness {result.fitness:.2f}, rmse {result.inlier_rmse * 1000:.1f} mm, "
+            f"translation error {error * 1000:.1f} mm"
+        )
+        assert error < voxel / 2 and result.scale == 1
@@ -5,19 +5,35 @@ import open3d as o3d
 
 import argparse
 
+# run from anywhere, the server's modules import each other by name like main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chunk_store import ChunkStore
+
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Visualize point cloud files from a directory.")
-    parser.add_argument("output_dir", type=str, help="Path to the directory containing the .pcd files")
+    parser = argparse.ArgumentParser(description="Visualize a chunk store or point cloud files from a directory.")
+    parser.add_argument("output_dir", type=str, help="Path to the chunk store or the directory containing .pcd files")
     args = parser.parse_args()
 
     output_dir = Path(args.output_dir)
     if not output_dir.is_dir():
         raise ValueError(f"The provided path '{output_dir}' is not a valid directory.")
 
-    samples: list[o3d.geometry.PointCloud] = [o3d.io.read_point_cloud(p) for p in output_dir.glob("*.pcd")]
+    store = ChunkStore(output_dir, read_only=True)
+    entries = store.manifest.entries()
+    if entries:
+        min_bound = [min(entry.min_bound[i] for entry in entries) for i in range(3)]
+        max_bound = [max(entry.max_bound[i] for entry in entries) for i in range(3)]
+        print(
+            f"{len(entries)} chunks, {sum(entry.count for entry in entries)} points, "
+            f"{sum(entry.bytes for entry in entries) / 2**20:.1f} MiB, bounds {min_bound} to {max_bound}"
+        )
+    samples: list[o3d.geometry.PointCloud] = [store.read(entry.key) for entry in entries]
+    # archived scans
+    samples += [o3d.io.read_point_cloud(p) for p in output_dir.glob("*.pcd")]
     if not samples:
-        sys.exit("No .pcd files found in the specified directory.")
+        sys.exit("No chunks or .pcd files found in the specified directory.")
     center = samples[0].get_center()
     o3d.visualization.draw_geometries(
         samples,
@@ -1,8 +1,13 @@
 import logging
+import sys
+from pathlib import Path
 
 import numpy as np
 
-from server.nodes.skymap.server.integrator import ReconstructionVolume
+# run from anywhere, the server's modules import each other by name like main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from integrator import ReconstructionVolume
 import open3d as o3d
 
 
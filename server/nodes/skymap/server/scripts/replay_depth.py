@@ -1,3 +1,4 @@
+import sys
 import time
 from pathlib import Path
 
@@ -6,7 +7,10 @@ import numpy as np
 import open3d as o3d
 import os
 
-from server.nodes.skymap.server.integrator import ReconstructionVolume
+# run from anywhere, the server's modules import each other by name like main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from integrator import ReconstructionVolume
 from swarmnode_skymap_common import (
     ZhouDepthEncoder,
     depth_units,
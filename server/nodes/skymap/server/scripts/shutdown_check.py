@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import open3d as o3d
+
+# run from anywhere, the server's modules import each other by name like main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import integrator
+from integrator import ReconstructionVolume
+
+
+class FlatVolume:
+    """
+    Stand-in TSDF volume: each flush takes flush_time and returns a flat patch inside the chunk of the sensor,
+    so the check can tell whose surface made it into the store.
+    """
+
+    def __init__(self, index: int, flush_time: float):
+        self.index = index
+        self.flush_time = flush_time
+
+    def integrate(self, image, intrinsic, extrinsic):
+        pass
+
+    def extract_point_cloud(self) -> o3d.geometry.PointCloud:
+        return o3d.geometry.PointCloud()
+
+    def flush(self) -> o3d.geometry.PointCloud:
+        time.sleep(self.flush_time)
+        xs, ys = np.meshgrid(np.arange(0.5, 2.5, 0.05), np.arange(0.5, 2.5, 0.05))
+        points = np.stack([xs.ravel() + self.index * ReconstructionVolume.CHUNK_SIZE, ys.ravel(), np.ones(xs.size)], 1)
+        pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+        pcd.colors = o3d.utility.Vector3dVector(np.full_like(points, 0.5))
+        return pcd
+
+    def reset(self):
+        pass
+
+    def memory_bytes(self) -> int | None:
+        return None
+
+    def used_bytes(self) -> int | None:
+        return None
+
+
+async def check(sensors: int, images: int, rollover_images: int, flush_time: float, timeout: float):
+    volumes = iter(range(sensors))
+    integrator.create_tsdf_volume = lambda *args: FlatVolume(next(volumes), flush_time)
+    # roll over while close() drains the sensors' queues, not only on the final rollover
+    ReconstructionVolume.IMAGE_THRESHOLD = rollover_images
+    names = [f"sensor{i}" for i in range(sensors)]
+    with tempfile.TemporaryDirectory() as directory:
+        volume = ReconstructionVolume(Path(directory), drop_policy="block", sensors=names)
+        for _ in range(images):
+            for name in names:
+                await volume.add_image(None, np.eye(4), np.eye(4), sensor=name)
+        start = time.time()
+        try:
+            await asyncio.wait_for(volume.close(), timeout)
+        except TimeoutError:
+            sys.exit(f"close() did not return within {timeout} s with {sensors} sensors")
+        expected = {(i * ReconstructionVolume.CHUNK_SIZE, 0, 0) for i in range(sensors)}
+        missing = expected - set(volume.store.keys())
+        if missing:
+            sys.exit(f"the final surfaces of chunks {sorted(missing)} were not written")
+        print(f"closed {sensors} sensors in {time.time() - start:.1f} s, all {len(expected)} surfaces written")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that ReconstructionVolume.close() returns and writes every sensor's final surface."
+    )
+    parser.add_argument(
+        "--sensors", type=int, default=4, help="sensors closed at once, more than the two rollovers pcd_queue holds"
+    )
+    parser.add_argument("--images", type=int, default=8, help="images queued per sensor before closing")
+    parser.add_argument("--rollover-images", type=int, default=3, help="IMAGE_THRESHOLD of the stand-in volumes")
+    parser.add_argument("--flush-time", type=float, default=0.5, help="seconds each flush takes")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds close() may take")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(check(args.sensors, args.images, args.rollover_images, args.flush_time, args.timeout))
@@ -0,0 +1,101 @@
+import math
+import struct
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from swarmnode_skymap_common import GPSPose
+
+# Append-only file: a fixed header followed by fixed-size little-endian records, one per integrated frame.
+# A crash can at most leave a partial trailing record, which the reader ignores.
+HEADER_FORMAT = "<8sddd"  # magic, ENU origin (latitude, longitude, altitude)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"SKYTRAJ1"
+TRAJECTORY_DTYPE = np.dtype(
+    [
+        ("frame_sequence", "<u8"),
+        ("quality", "<u8"),
+        ("epoch_seconds", "<f8"),
+        ("capture_epoch_seconds", "<f8"),  # nan if the sensor array did not stamp the frame
+        ("gps", "<f8", (3,)),  # latitude, longitude, altitude
+        ("orientation", "<f8", (3,)),  # yaw, pitch, roll in degrees
+        ("enu", "<f8", (3,)),
+        ("extrinsic", "<f8", (4, 4)),
+    ]
+)
+
+
+class Trajectory(NamedTuple):
+    origin: tuple[float, float, float]
+    records: np.ndarray
+
+
+class TrajectoryWriter:
+    def __init__(self, path: Path, origin: tuple[float, float, float]):
+        self.path = path
+        if path.exists() and path.stat().st_size >= HEADER_SIZE:
+            existing = load_trajectory(path)
+            if not np.allclose(existing.origin, origin):
+                raise ValueError(f"{path} has ENU origin {existing.origin}, not {origin}")
+            # drop a partial trailing record so appends stay aligned
+            with open(path, "r+b") as f:
+                f.truncate(HEADER_SIZE + existing.records.shape[0] * TRAJECTORY_DTYPE.itemsize)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            self.file.write(struct.pack(HEADER_FORMAT, MAGIC, *origin))
+        self.record = np.zeros(1, dtype=TRAJECTORY_DTYPE)
+
+    def append(self, pose: GPSPose, enu: tuple[float, float, float], extrinsic: np.ndarray):
+        record = self.record[0]
+        record["frame_sequence"] = pose.frame_sequence
+        record["quality"] = pose.quality
+        record["epoch_seconds"] = pose.epoch_seconds
+        record["capture_epoch_seconds"] = math.nan if pose.capture_epoch_seconds is None else pose.capture_epoch_seconds
+        record["gps"] = (pose.latitude, pose.longitude, pose.altitude)
+        record["orientation"] = (pose.yaw, pose.pitch, pose.roll)
+        record["enu"] = enu
+        record["extrinsic"] = extrinsic
+        self.file.write(self.record.tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load_trajectory(path: Path) -> Trajectory:
+    """Memory-map a trajectory file. Fields of the returned records are numpy views, e.g. records["enu"]."""
+    with open(path, "rb") as f:
+        magic, *origin = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a trajectory file")
+    count = (path.stat().st_size - HEADER_SIZE) // TRAJECTORY_DTYPE.itemsize
+    if count == 0:
+        return Trajectory(tuple(origin), np.zeros(0, dtype=TRAJECTORY_DTYPE))
+    records = np.memmap(path, dtype=TRAJECTORY_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+    return Trajectory(tuple(origin), records)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a scan trajectory file.")
+    parser.add_argument("trajectory", type=Path, help="Path to trajectory.bin")
+    args = parser.parse_args()
+
+    trajectory = load_trajectory(args.trajectory)
+    records = trajectory.records
+    print(f"origin: {trajectory.origin}")
+    print(f"poses: {records.shape[0]}")
+    if records.shape[0]:
+        duration = records["epoch_seconds"][-1] - records["epoch_seconds"][0]
+        distance = np.linalg.norm(np.diff(records["enu"], axis=0), axis=1).sum()
+        print(f"duration: {duration:.1f} s, path length: {distance:.1f} m")
+        print(f"ENU bounds: {records['enu'].min(axis=0)} - {records['enu'].max(axis=0)}")
@@ -0,0 +1,360 @@
+from typing import Protocol
+
+import numpy as np
+import open3d as o3d
+import open3d.core as o3c
+
+
+class TSDFVolume(Protocol):
+    """The part of a TSDF backend ReconstructionVolume relies on."""
+
+    def integrate(
+        self, rgbd_image: o3d.geometry.RGBDImage, intrinsic: o3d.camera.PinholeCameraIntrinsic, extrinsic: np.ndarray
+    ): ...
+
+    def extract_point_cloud(self) -> o3d.geometry.PointCloud: ...
+
+    def flush(self) -> o3d.geometry.PointCloud:
+        """Surface integrated since the last flush; what is no longer needed for fusing may be released."""
+        ...
+
+    def reset(self): ...
+
+    def memory_bytes(self) -> int | None:
+        """Bytes allocated for voxels, None if the backend does not report it."""
+        ...
+
+    def used_bytes(self) -> int | None:
+        """Bytes of the voxels currently in use, which flush may release; None if the backend does not report it."""
+        ...
+
+
+class ScalableTSDFVolume:
+    """The legacy single-threaded ScalableTSDFVolume."""
+
+    def __init__(self, voxel_size: float, sdf_trunc: float):
+        self.volume = o3d.pipelines.integration.ScalableTSDFVolume(
+            voxel_length=voxel_size,
+            sdf_trunc=sdf_trunc,
+            color_type=o3d.pipelines.integration.TSDFVolumeColorType.RGB8,
+        )
+
+    def integrate(
+        self, rgbd_image: o3d.geometry.RGBDImage, intrinsic: o3d.camera.PinholeCameraIntrinsic, extrinsic: np.ndarray
+    ):
+        self.volume.integrate(rgbd_image, intrinsic, extrinsic)
+
+    def extract_point_cloud(self) -> o3d.geometry.PointCloud:
+        return self.volume.extract_point_cloud()
+
+    def flush(self) -> o3d.geometry.PointCloud:
+        # no block level access, so the whole volume is emitted and fusing starts over
+        pcd = self.volume.extract_point_cloud()
+        self.volume.reset()
+        return pcd
+
+    def reset(self):
+        self.volume.reset()
+
+    def memory_bytes(self) -> int | None:
+        # not exposed by the legacy volume
+        return None
+
+    def used_bytes(self) -> int | None:
+        return None
+
+
+class VoxelBlockGridVolume:
+    """
+    Open3D tensor VoxelBlockGrid: voxels live in blocks of block_resolution^3 addressed through a hash map, and
+    integration runs multithreaded over the blocks in the camera frustum.
+
+    Expects legacy RGBDImages as produced by create_from_color_and_depth (float depth in meters, uint8 color).
+
+    flush() only emits the surface voxels of blocks integrated into since the previous flush, and erases blocks
+    that have not been integrated into for idle_flushes flushes. Blocks around the drone stay resident and keep
+    fusing across flushes; an erased block had its final surface emitted by the flush after its last update.
+    """
+
+    # blocks whose voxels are gathered at once while flushing, bounds the temporary voxel arrays
+    FLUSH_BATCH_BLOCKS = 1024
+
+    ATTRIBUTES = {
+        # name -> (dtype, channels)
+        "tsdf": (o3c.float32, 1),
+        "weight": (o3c.float32, 1),
+        "color": (o3c.float32, 3),
+    }
+
+    def __init__(
+        self,
+        voxel_size: float,
+        sdf_trunc: float,
+        depth_max: float = 10.0,
+        block_resolution: int = 16,
+        block_count: int = 10000,
+        weight_threshold: float = 3.0,
+        idle_flushes: int = 2,
+        device: str = "CPU:0",
+    ):
+        self.voxel_size = voxel_size
+        self.trunc_voxel_multiplier = sdf_trunc / voxel_size
+        self.depth_max = depth_max
+        self.block_resolution = block_resolution
+        self.block_count = block_count
+        self.weight_threshold = weight_threshold
+        self.idle_flushes = idle_flushes
+        self.device = o3c.Device(device)
+        self.vbg = self._create()
+        self._clear_block_tracking()
+
+    def _clear_block_tracking(self):
+        self.flushes = 0
+        # block coordinates integrated into since the last flush, one array per frame
+        self._touched: list[np.ndarray] = []
+        # resident blocks and the flush they were last integrated into before
+        self._block_keys = np.zeros((0, 3), dtype=np.int32)
+        self._block_flush = np.zeros(0, dtype=np.int64)
+
+    def _create(self) -> o3d.t.geometry.VoxelBlockGrid:
+        return o3d.t.geometry.VoxelBlockGrid(
+            attr_names=tuple(self.ATTRIBUTES),
+            attr_dtypes=tuple(dtype for dtype, _ in self.ATTRIBUTES.values()),
+            attr_channels=tuple(o3c.SizeVector([channels]) for _, channels in self.ATTRIBUTES.values()),
+            voxel_size=self.voxel_size,
+            block_resolution=self.block_resolution,
+            block_count=self.block_count,
+            device=self.device,
+        )
+
+    def integrate(
+        self, rgbd_image: o3d.geometry.RGBDImage, intrinsic: o3d.camera.PinholeCameraIntrinsic, extrinsic: np.ndarray
+    ):
+        depth = o3d.t.geometry.Image.from_legacy(rgbd_image.depth, self.device)
+        # stored colors are averaged as floats, scale to [0, 1] so extracted colors match the legacy volume
+        color = o3d.t.geometry.Image(
+            o3c.Tensor(np.asarray(rgbd_image.color, dtype=np.float32) / 255, o3c.float32, self.device)
+        )
+        # the camera parameters stay on the CPU whatever the device of the voxels
+        cpu = o3c.Device("CPU:0")
+        intrinsic_matrix = o3c.Tensor(intrinsic.intrinsic_matrix, o3c.float64, cpu)
+        extrinsic_matrix = o3c.Tensor(extrinsic, o3c.float64, cpu)
+        block_coords = self.vbg.compute_unique_block_coordinates(
+            depth, intrinsic_matrix, extrinsic_matrix, 1.0, self.depth_max, self.trunc_voxel_multiplier
+        )
+        self.vbg.integrate(
+            block_coords,
+            depth,
+            color,
+            intrinsic_matrix,
+            extrinsic_matrix,
+            1.0,
+            self.depth_max,
+            self.trunc_voxel_multiplier,
+        )
+        self._touched.append(block_coords.cpu().numpy())
+
+    def extract_point_cloud(self) -> o3d.geometry.PointCloud:
+        return self.vbg.extract_point_cloud(self.weight_threshold).to_legacy()
+
+    def flush(self) -> o3d.geometry.PointCloud:
+        self.flushes += 1
+        if self._touched:
+            touched = np.unique(np.concatenate(self._touched), axis=0)
+        else:
+            touched = np.zeros((0, 3), dtype=np.int32)
+        self._touched = []
+
+        keys = np.concatenate((self._block_keys, touched))
+        flushes = np.concatenate((self._block_flush, np.full(touched.shape[0], self.flushes)))
+        keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        last_flush = np.zeros(keys.shape[0], dtype=np.int64)
+        np.maximum.at(last_flush, inverse.reshape(-1), flushes)
+
+        pcd = self._extract_surface(touched)
+
+        idle = last_flush <= self.flushes - self.idle_flushes
+        if idle.any():
+            self.vbg.hashmap().erase(o3c.Tensor(keys[idle], o3c.int32, self.device))
+        self._block_keys = keys[~idle]
+        self._block_flush = last_flush[~idle]
+        return pcd
+
+    def _extract_surface(self, block_keys: np.ndarray) -> o3d.geometry.PointCloud:
+        """Voxels within half a voxel of the zero crossing, from the given blocks only."""
+        tsdf_attribute = self.vbg.attribute("tsdf").reshape(o3c.SizeVector([-1]))
+        weight_attribute = self.vbg.attribute("weight").reshape(o3c.SizeVector([-1]))
+        color_attribute = self.vbg.attribute("color").reshape(o3c.SizeVector([-1, 3]))
+        points = []
+        colors = []
+        for start in range(0, block_keys.shape[0], self.FLUSH_BATCH_BLOCKS):
+            batch = o3c.Tensor(block_keys[start : start + self.FLUSH_BATCH_BLOCKS], o3c.int32, self.device)
+            buf_indices, masks = self.vbg.hashmap().find(batch)
+            voxel_coords, voxel_indices = self.vbg.voxel_coordinates_and_flattened_indices(buf_indices[masks])
+            # tsdf is stored normalized by the truncation distance
+            tsdf = tsdf_attribute[voxel_indices].cpu().numpy()
+            weight = weight_attribute[voxel_indices].cpu().numpy()
+            surface = (weight >= self.weight_threshold) & (np.abs(tsdf) * self.trunc_voxel_multiplier < 0.5)
+            points.append(voxel_coords.cpu().numpy()[surface])
+            colors.append(color_attribute[voxel_indices].cpu().numpy()[surface])
+
+        pcd = o3d.geometry.PointCloud()
+        if points:
+            pcd.points = o3d.utility.Vector3dVector(np.concatenate(points).astype(np.float64))
+            pcd.colors = o3d.utility.Vector3dVector(np.clip(np.concatenate(colors), 0, 1).astype(np.float64))
+        return pcd
+
+    def reset(self):
+        self.vbg = self._create()
+        self._clear_block_tracking()
+
+    def active_blocks(self) -> int:
+        return self.vbg.hashmap().size()
+
+    def _block_bytes(self) -> int:
+        voxels = self.block_resolution**3
+        return voxels * sum(dtype.byte_size() * channels for dtype, channels in self.ATTRIBUTES.values())
+
+    def memory_bytes(self) -> int | None:
+        # voxel storage is allocated per hash map slot, block keys and hash buckets are comparatively small
+        return self.vbg.hashmap().capacity() * self._block_bytes()
+
+    def used_bytes(self) -> int | None:
+        return self.active_blocks() * self._block_bytes()
+
+
+BACKENDS = {
+    "legacy": ScalableTSDFVolume,
+    "voxel_block_grid": VoxelBlockGridVolume,
+}
+
+
+def create_tsdf_volume(backend: str, voxel_size: float, sdf_trunc: float) -> TSDFVolume:
+    try:
+        return BACKENDS[backend](voxel_size, sdf_trunc)
+    except KeyError:
+        raise ValueError(f"unknown TSDF backend {backend!r}, expected one of {', '.join(BACKENDS)}") from None
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import resource
+    import time
+    from pathlib import Path
+
+    def rss_bytes() -> int:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def synthetic_flight(count: int, intrinsic: o3d.camera.PinholeCameraIntrinsic, altitude: float = 4.0):
+        """A nadir camera flying a straight line over rolling terrain, 0.1 m between frames."""
+        width, height = intrinsic.width, intrinsic.height
+        fx, fy = intrinsic.get_focal_length()
+        cx, cy = intrinsic.get_principal_point()
+        u, v = np.meshgrid(np.arange(width), np.arange(height))
+        for i in range(count):
+            x0 = i * 0.1
+            # ground point under each pixel, evaluated on the flat plane first (ignores parallax of the relief)
+            gx = x0 + (u - cx) / fx * altitude
+            gy = -(v - cy) / fy * altitude
+            ground = 0.5 * np.sin(gx / 3) * np.cos(gy / 4)
+            depth = (altitude - ground).astype(np.float32)
+            shade = ((ground + 0.5) * 255).astype(np.uint8)
+            color = np.stack([shade, np.full_like(shade, 128), 255 - shade], axis=-1)
+            rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
+                o3d.geometry.Image(np.ascontiguousarray(color)),
+                o3d.geometry.Image(depth),
+                depth_scale=1.0,
+                depth_trunc=10.0,
+                convert_rgb_to_intensity=False,
+            )
+            # camera looking straight down: x right, y backwards, z down
+            pose = np.array([[1, 0, 0, x0], [0, -1, 0, 0], [0, 0, -1, altitude], [0, 0, 0, 1]], dtype=np.float64)
+            yield rgbd, pose
+
+    def lounge_flight(count: int):
+        from integrator import read_trajectory
+
+        lounge = o3d.data.LoungeRGBDImages()
+        poses = read_trajectory(lounge.trajectory_log_path)
+        for i in range(min(count, len(poses))):
+            rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
+                o3d.io.read_image(Path(lounge.color_paths[i])),
+                o3d.io.read_image(Path(lounge.depth_paths[i])),
+                depth_trunc=6.0,
+                convert_rgb_to_intensity=False,
+            )
+            yield rgbd, poses[i].pose
+
+    def recorded_flight(count: int, directory: Path):
+        """Raw video frames saved by video_processor (frames/*.npz), decoded the way reconstructor does."""
+        from gps_cartesian import ENUCoordinateSystem, create_rigid_transform
+        from swarmnode_skymap_common import ZhouDepthEncoder, depth_units, max_depth_meters, min_depth_meters
+
+        decoder = ZhouDepthEncoder(depth_units, min_depth_meters, max_depth_meters)
+        coord = ENUCoordinateSystem()
+        produced = 0
+        for path in sorted(directory.glob("*.npz"), key=lambda p: int(p.stem)):
+            with np.load(path) as frames:
+                for name in frames.files:
+                    rgb, d, gps = decoder.video_frame_to_rgbd(frames[name].copy())
+                    if gps is None:
+                        continue
+                    rgbd = o3d.geometry.RGBDImage.create_from_color_and_depth(
+                        o3d.geometry.Image(np.ascontiguousarray(rgb)),
+                        o3d.geometry.Image(np.ascontiguousarray(d)),
+                        depth_scale=1 / depth_units,
+                        depth_trunc=max_depth_meters,
+                        convert_rgb_to_intensity=False,
+                    )
+                    if not coord.has_origin():
+                        coord.set_enu_origin(gps.latitude, gps.longitude, gps.altitude)
+                    cartesian = coord.gps2enu(gps.latitude, gps.longitude, gps.altitude)
+                    x, y, z = cartesian.item(0), cartesian.item(1), cartesian.item(2)
+                    extrinsic, _ = create_rigid_transform(y, x, z, gps.yaw, gps.pitch, gps.roll)
+                    yield rgbd, extrinsic
+                    produced += 1
+                    if produced >= count:
+                        return
+
+    parser = argparse.ArgumentParser(description="Compare TSDF backends on integration throughput and memory.")
+    parser.add_argument("backend", choices=BACKENDS)
+    parser.add_argument("--dataset", choices=("synthetic", "lounge", "recorded"), default="synthetic")
+    parser.add_argument("--frames", type=Path, help="frames/ directory of a scan, for --dataset recorded")
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--voxel-size", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.dataset == "lounge":
+        intrinsic = o3d.camera.PinholeCameraIntrinsic(o3d.camera.PinholeCameraIntrinsicParameters.PrimeSenseDefault)
+    else:
+        from integrator import ReconstructionVolume
+
+        intrinsic = ReconstructionVolume.INTRINSICS
+    if args.dataset == "synthetic":
+        frames = list(synthetic_flight(args.count, intrinsic))
+    elif args.dataset == "lounge":
+        frames = list(lounge_flight(args.count))
+    else:
+        frames = list(recorded_flight(args.count, args.frames))
+
+    # load every frame first so only integration is timed and measured
+    baseline = rss_bytes()
+    volume = create_tsdf_volume(args.backend, args.voxel_size, args.voxel_size * 5)
+    start = time.perf_counter()
+    for rgbd, pose in frames:
+        volume.integrate(rgbd, intrinsic, np.linalg.inv(pose))
+    integrate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pcd = volume.extract_point_cloud()
+    extract_time = time.perf_counter() - start
+
+    print(f"backend: {args.backend}, dataset: {args.dataset}, frames: {len(frames)}")
+    print(f"integrate: {integrate_time:.2f} s, {len(frames) / integrate_time:.1f} frames/s")
+    print(f"extract: {extract_time:.2f} s, {np.asarray(pcd.points).shape[0]} points")
+    print(f"rss growth: {(rss_bytes() - baseline) / 2**20:.0f} MiB")
+    print(f"peak rss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10:.0f} MiB")
+    memory = volume.memory_bytes()
+    if memory is not None:
+        print(f"volume memory: {memory / 2**20:.0f} MiB")
@@ -13,6 +13,18 @@ from textual.containers import VerticalScroll, Horizontal
 from textual.widgets import Header, Log, ProgressBar, Label, Switch, DataTable, ContentSwitcher, Button
 from textual.widgets._data_table import RowKey, ColumnKey
 
+from metrics import (
+    ChunkCacheStats,
+    ChunkWriterStats,
+    Histogram,
+    IntegrationStats,
+    KeyframeStats,
+    MemoryStats,
+    MergeStats,
+    LATENCY_BUCKETS,
+    GAP_BUCKETS,
+)
+
 
 class ScanStateStatus(IntEnum):
     waiting = 1
@@ -44,6 +56,49 @@ class ScanState:
     frames_corrupted: int = 0
     images_integrated: int = 0
 
+    # per sensor, each numbers its frames
+    last_frame_sequence: dict[str, int] = dataclasses.field(default_factory=dict)
+    frames_dropped: int = 0
+    frame_gaps: Histogram = dataclasses.field(default_factory=lambda: Histogram(GAP_BUCKETS))
+    # capture on the sensor array -> arrival at the server (encode + network)
+    transport_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # arrival -> taken off the sensor's frame queue by ingest
+    frame_queue_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # taken off the frame queue -> pose decoded
+    decode_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    # capture -> pose decoded
+    frame_latency: Histogram = dataclasses.field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    chunk_cache: ChunkCacheStats = dataclasses.field(default_factory=ChunkCacheStats)
+    chunk_writer: ChunkWriterStats = dataclasses.field(default_factory=ChunkWriterStats)
+    # per sensor
+    integration: dict[str, IntegrationStats] = dataclasses.field(default_factory=dict)
+    merges: MergeStats = dataclasses.field(default_factory=MergeStats)
+    memory: MemoryStats = dataclasses.field(default_factory=MemoryStats)
+    # per sensor
+    keyframes: dict[str, KeyframeStats] = dataclasses.field(default_factory=dict)
+
+    def record_frame(
+        self,
+        sensor: str,
+        sequence: int,
+        capture_time: float | None,
+        arrival_time: float,
+        dequeued_time: float,
+        decoded_time: float,
+    ):
+        last = self.last_frame_sequence.get(sensor)
+        if last is not None and sequence > last + 1:
+            gap = sequence - last - 1
+            self.frames_dropped += gap
+            self.frame_gaps.record(gap)
+        # a lower sequence number means the sensor array restarted, start counting from there
+        self.last_frame_sequence[sensor] = sequence
+        self.frame_queue_latency.record(dequeued_time - arrival_time)
+        self.decode_latency.record(decoded_time - dequeued_time)
+        if capture_time is not None:
+            self.transport_latency.record(arrival_time - capture_time)
+            self.frame_latency.record(decoded_time - capture_time)
+
 
 class SkymapScanTui(App):
     TITLE = "SkyMap Controller"
@@ -105,7 +160,7 @@ class SkymapScanTui(App):
         self.conn_col_keys: list[ColumnKey] | None = None
         self.conn_row_keys: list[RowKey] | None = None
         self.recon_col_keys: list[ColumnKey] | None = None
-        self.recon_row_keys: list[RowKey] | None = None
+        self.recon_row_keys: dict[str, RowKey] | None = None
 
         super().__init__(*args, **kwargs)
 
@@ -142,13 +197,47 @@ class SkymapScanTui(App):
         self.conn_col_keys = [dt_connection.add_column(n, width=w) for n, w in layout]
         self.conn_row_keys = [dt_connection.add_row(row, self.unknown_cell) for row in conn_rows]
 
-        recon_rows = ["Frames Received", "Frames Corrupted", "Images Integrated"]
+        recon_rows = [
+            "Frames Received",
+            "Frames Corrupted",
+            "Images Integrated",
+            "Frames Dropped",
+            "Frame Gaps",
+            "Latency (transport)",
+            "Latency (frame queue)",
+            "Latency (decode)",
+            "Latency (end-to-end)",
+            "Chunks Resident",
+            "Chunk Cache (hit/miss)",
+            "Chunk Evictions/Reloads",
+            "Chunk Write Queue",
+            "Chunk Write Latency",
+            "Integration Queue",
+            "Integration Latency",
+            "Integration Queue Wait",
+            "Chunk Merges",
+            "Chunk Merge Latency",
+            "Outlier Rejection",
+            "Memory (TSDF + chunks)",
+            "Keyframes",
+            "Sensors",
+        ]
         dt_reconstruction = self.query_one("#dt-reconstruction", DataTable)
         self.recon_col_keys = [dt_reconstruction.add_column(n, width=w) for n, w in layout]
-        self.recon_row_keys = [dt_reconstruction.add_row(row, self.unknown_cell) for row in recon_rows]
+        self.recon_row_keys = {row: dt_reconstruction.add_row(row, self.unknown_cell) for row in recon_rows}
 
         self.set_interval(1, self.update)
 
+    def histogram_cell(self, histogram: Histogram, scale: float, unit: str) -> Text | str:
+        if not histogram.count:
+            return self.unknown_cell
+        return (
+            f"p50 {histogram.quantile(0.5) * scale:.0f}{unit}  "
+            f"p95 {histogram.quantile(0.95) * scale:.0f}{unit}  "
+            f"max {histogram.maximum * scale:.0f}{unit}  "
+            f"[{histogram.sparkline()}]"
+        )
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         self.query_one(ContentSwitcher).current = event.button.id
 
@@ -261,13 +350,112 @@ class SkymapScanTui(App):
 
         dt_reconstruction = self.query_one("#dt-reconstruction", DataTable)
         dt_reconstruction.update_cell(
-            self.recon_row_keys[0], self.recon_col_keys[1], str(self.scan_state.frames_received)
+            self.recon_row_keys["Frames Received"], self.recon_col_keys[1], str(self.scan_state.frames_received)
         )
         dt_reconstruction.update_cell(
-            self.recon_row_keys[1], self.recon_col_keys[1], str(self.scan_state.frames_corrupted)
+            self.recon_row_keys["Frames Corrupted"], self.recon_col_keys[1], str(self.scan_state.frames_corrupted)
         )
         dt_reconstruction.update_cell(
-            self.recon_row_keys[2], self.recon_col_keys[1], str(self.scan_state.images_integrated)
+            self.recon_row_keys["Images Integrated"], self.recon_col_keys[1], str(self.scan_state.images_integrated)
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Frames Dropped"], self.recon_col_keys[1], str(self.scan_state.frames_dropped)
+        )
+        histograms = [
+            ("Frame Gaps", self.scan_state.frame_gaps, 1, ""),
+            ("Latency (transport)", self.scan_state.transport_latency, 1000, " ms"),
+            ("Latency (frame queue)", self.scan_state.frame_queue_latency, 1000, " ms"),
+            ("Latency (decode)", self.scan_state.decode_latency, 1000, " ms"),
+            ("Latency (end-to-end)", self.scan_state.frame_latency, 1000, " ms"),
+        ]
+        for row, histogram, scale, unit in histograms:
+            dt_reconstruction.update_cell(
+                self.recon_row_keys[row], self.recon_col_keys[1], self.histogram_cell(histogram, scale, unit)
+            )
+        chunk_cache = self.scan_state.chunk_cache
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunks Resident"], self.recon_col_keys[1], str(chunk_cache.resident)
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Cache (hit/miss)"],
+            self.recon_col_keys[1],
+            f"{chunk_cache.hits} / {chunk_cache.misses}",
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Evictions/Reloads"],
+            self.recon_col_keys[1],
+            f"{chunk_cache.evictions} / {chunk_cache.reloads}",
+        )
+        chunk_writer = self.scan_state.chunk_writer
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Write Queue"],
+            self.recon_col_keys[1],
+            f"{chunk_writer.queue_depth} pending, {chunk_writer.writes} written, {chunk_writer.skipped} superseded, "
+            f"{chunk_writer.failed} failed",
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Write Latency"],
+            self.recon_col_keys[1],
+            self.histogram_cell(chunk_writer.write_latency, 1000, " ms"),
+        )
+        integration = IntegrationStats.combined(list(self.scan_state.integration.values()))
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Integration Queue"],
+            self.recon_col_keys[1],
+            f"{integration.queue_depth} queued, {integration.dropped} dropped",
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Integration Latency"],
+            self.recon_col_keys[1],
+            self.histogram_cell(integration.latency, 1000, " ms"),
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Integration Queue Wait"],
+            self.recon_col_keys[1],
+            self.histogram_cell(integration.queue_latency, 1000, " ms"),
+        )
+        merges = self.scan_state.merges
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Merges"],
+            self.recon_col_keys[1],
+            f"{merges.fast} fused, {merges.registered} registered, {merges.failed} failed",
+        )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Chunk Merge Latency"],
+            self.recon_col_keys[1],
+            self.histogram_cell(merges.latency, 1000, " ms"),
+        )
+        rejection = f"{merges.outliers_rejected} of {merges.outliers_checked} points"
+        if merges.outliers_checked:
+            rejection += f" ({merges.outliers_rejected / merges.outliers_checked:.1%})"
+        if merges.outlier_latency.count:
+            rejection += f"  {self.histogram_cell(merges.outlier_latency, 1000, ' ms')}"
+        dt_reconstruction.update_cell(self.recon_row_keys["Outlier Rejection"], self.recon_col_keys[1], rejection)
+        memory = self.scan_state.memory
+        tsdf = "?" if memory.tsdf is None else f"{memory.tsdf / 2**20:.0f}"
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Memory (TSDF + chunks)"],
+            self.recon_col_keys[1],
+            f"{tsdf} + {memory.chunks / 2**20:.0f} / {memory.budget / 2**20:.0f} MiB",
+        )
+        keyframes = KeyframeStats.combined(list(self.scan_state.keyframes.values()))
+        skip_rate = keyframes.skip_rate()
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Keyframes"],
+            self.recon_col_keys[1],
+            f"{keyframes.selected} selected, {keyframes.skipped} skipped"
+            + ("" if skip_rate is None else f" ({skip_rate:.0%})"),
+        )
+        sensors = []
+        for name, stats in self.scan_state.integration.items():
+            sensor_keyframes = self.scan_state.keyframes.get(name)
+            sensor_skip_rate = None if sensor_keyframes is None else sensor_keyframes.skip_rate()
+            sensors.append(
+                f"{name}: {stats.integrated} integrated, {stats.queue_depth} queued, {stats.dropped} dropped"
+                + ("" if sensor_skip_rate is None else f", {sensor_skip_rate:.0%} skipped")
+            )
+        dt_reconstruction.update_cell(
+            self.recon_row_keys["Sensors"], self.recon_col_keys[1], " | ".join(sensors) or self.unknown_cell
         )
 
         log = self.query_one(Log)
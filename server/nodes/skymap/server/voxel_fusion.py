@@ -0,0 +1,150 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# voxel indices are packed into one int64 key, 21 bits per axis
+_key_bits = 21
+_key_offset = 1 << (_key_bits - 1)
+
+
+def voxel_keys(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """One int64 per point identifying its voxel, valid within +-2^20 voxels of the origin."""
+    indices = np.floor_divide(points, voxel_size).astype(np.int64) + _key_offset
+    return (indices[:, 0] << (2 * _key_bits)) | (indices[:, 1] << _key_bits) | indices[:, 2]
+
+
+def average_normals(inverse: np.ndarray, normals: np.ndarray, weights: np.ndarray | None = None) -> np.ndarray:
+    """
+    Weighted average of the normals in each group of inverse (np.unique's), regardless of their sign. Normals
+    oriented up point either way on vertical surfaces and their plain mean cancels out there, so each is flipped to
+    agree with its group's first normal before summing, then once more with that average. The averages are
+    oriented up again. Zero rows carry no weight; a group of only those gets a zero row.
+    """
+    if weights is None:
+        weights = np.ones(normals.shape[0])
+    groups = inverse.max(initial=-1) + 1
+    present = np.flatnonzero(np.any(normals != 0, axis=1))
+    # index of each group's first nonzero normal, one past the end for groups without
+    first = np.full(groups, normals.shape[0])
+    np.minimum.at(first, inverse[present], present)
+    reference = np.vstack((normals, np.zeros((1, 3))))[first]
+    for _ in range(2):
+        signed = weights * np.where(np.einsum("ij,ij->i", normals, reference[inverse]) < 0, -1.0, 1.0)
+        sums = np.stack(
+            [np.bincount(inverse, weights=signed * normals[:, i], minlength=groups) for i in range(3)], axis=1
+        )
+        reference = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    reference[reference[:, 2] < 0] *= -1
+    return reference
+
+
+class Fused(NamedTuple):
+    points: np.ndarray
+    colors: np.ndarray
+    weights: np.ndarray
+    # None unless normals were fused, nan rows where they need estimating again
+    normals: np.ndarray | None = None
+
+
+def fuse(
+    points: np.ndarray,
+    colors: np.ndarray,
+    weights: np.ndarray,
+    voxel_size: float,
+    max_weight: float | None = None,
+    normals: np.ndarray | None = None,
+) -> Fused:
+    """
+    Merge points sharing a voxel into their weighted mean position and color, summing the weights.
+
+    Fusing an existing chunk (with its stored weights) together with new points of weight 1 keeps a running
+    average per voxel. Capping the summed weight at max_weight lets long observed surfaces still follow new data.
+
+    normals are averaged over the points that have one, see average_normals; the others have a nan row. A voxel
+    where those without outweigh those with gets a nan normal: its surface is new or mostly new observations, and
+    the normal has to be estimated again. Well observed voxels keep theirs.
+    """
+    if not points.shape[0]:
+        return Fused(points, colors, weights, normals)
+    _, inverse = np.unique(voxel_keys(points, voxel_size), return_inverse=True)
+    inverse = inverse.reshape(-1)
+    total = np.bincount(inverse, weights=weights)
+    fused_points = np.stack([np.bincount(inverse, weights=weights * points[:, i]) for i in range(3)], axis=1)
+    fused_colors = np.stack([np.bincount(inverse, weights=weights * colors[:, i]) for i in range(3)], axis=1)
+    fused_points /= total[:, None]
+    fused_colors /= total[:, None]
+    fused_normals = None
+    if normals is not None:
+        unknown = np.isnan(normals[:, 0])
+        fused_normals = average_normals(inverse, np.where(unknown[:, None], 0, normals), weights)
+        fused_normals[2 * np.bincount(inverse, weights=weights * unknown) >= total] = np.nan
+    if max_weight is not None:
+        np.minimum(total, max_weight, out=total)
+    return Fused(fused_points, fused_colors, total, fused_normals)
+
+
+if __name__ == "__main__":
+    import time
+
+    from scipy.spatial import cKDTree
+
+    from registration import RegistrationTarget, estimate_normals, register
+
+    rng = np.random.default_rng(0)
+    voxel = 0.02
+    xs, ys = np.meshgrid(np.arange(0, 5, voxel), np.arange(0, 5, voxel))
+    chunk = np.stack([xs.ravel(), ys.ravel(), 0.3 * np.sin(xs.ravel()) * np.cos(ys.ravel() / 2)], axis=1)
+    chunk_colors = rng.random(chunk.shape)
+    incoming = chunk[rng.random(chunk.shape[0]) < 0.8] + rng.normal(scale=voxel / 4, size=(1, 3))
+    incoming_colors = rng.random(incoming.shape)
+
+    start = time.perf_counter()
+    target = RegistrationTarget(chunk)
+    register(incoming, target, voxel, scales=(16, 4, 1), time_budget=0.5)
+    registration_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fused = fuse(
+        np.concatenate((chunk, incoming)),
+        np.concatenate((chunk_colors, incoming_colors)),
+        np.ones(chunk.shape[0] + incoming.shape[0]),
+        voxel,
+    )
+    fuse_time = time.perf_counter() - start
+
+    print(f"{chunk.shape[0]} chunk points + {incoming.shape[0]} incoming -> {fused.points.shape[0]} fused")
+    print(f"registration: {registration_time * 1000:.1f} ms, voxel fusion: {fuse_time * 1000:.1f} ms")
+    assert fused.weights.sum() == chunk.shape[0] + incoming.shape[0]
+    assert np.all(np.floor_divide(fused.points, voxel).max(axis=0) <= np.floor_divide(chunk, voxel).max(axis=0) + 1)
+
+    # a chunk keeps its normals; a merge only estimates those of the voxels the incoming points (mostly) make up
+    chunk_normals = estimate_normals(chunk, cKDTree(chunk))
+    unknown = np.full_like(incoming, np.nan)
+    start = time.perf_counter()
+    fused = fuse(
+        np.concatenate((chunk, incoming)),
+        np.concatenate((chunk_colors, incoming_colors)),
+        np.concatenate((np.full(chunk.shape[0], 8.0), np.ones(incoming.shape[0]))),
+        voxel,
+        normals=np.concatenate((chunk_normals, unknown)),
+    )
+    stale = np.isnan(fused.normals[:, 0])
+    fused.normals[stale] = estimate_normals(fused.points, cKDTree(fused.points), subset=stale)
+    incremental_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normals = estimate_normals(fused.points, cKDTree(fused.points))
+    full_time = time.perf_counter() - start
+
+    print(f"normals: {stale.sum()} of {stale.shape[0]} estimated again")
+    print(f"fusion with incremental normals: {incremental_time * 1000:.1f} ms, all normals: {full_time * 1000:.1f} ms")
+    assert np.abs(np.einsum("ni,ni->n", fused.normals, normals)).min() > 0.9
+
+    # normals of a wall point either side once oriented up, their coarse averages must not cancel out
+    zs, ys = np.meshgrid(np.arange(0, 2, voxel), np.arange(0, 5, voxel))
+    wall = np.stack([np.full(zs.size, 2.5), ys.ravel(), zs.ravel()], axis=1)
+    wall += rng.normal(scale=voxel / 4, size=wall.shape)
+    wall_normals = estimate_normals(wall, cKDTree(wall))
+    fused = fuse(wall, np.zeros_like(wall), np.ones(wall.shape[0]), 16 * voxel, normals=wall_normals)
+    print(f"wall: {np.mean(wall_normals[:, 0] > 0):.0%} of the normals point +x")
+    assert np.abs(fused.normals[:, 0]).min() > 0.9